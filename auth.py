@@ -1,7 +1,14 @@
+import time
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from passlib.context import CryptContext
-from jose import jwt
+from jose import jwt, ExpiredSignatureError
 from datetime import datetime, timedelta
 
+from cache import LRUCache
+from config import AUTH_CACHE_ITEMS, AUTH_CACHE_TTL
+
 SECRET_KEY = "super-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
@@ -24,3 +31,100 @@ def decode_access_token(token: str) -> dict:
 
 
 # адаптивное прогнозирование с учетом устаревания устаревших экзаменов
+
+
+# Расшифрованные токены: token -> (пользователь, срок действия токена).
+# Пользователь загружается из БД один раз за AUTH_CACHE_TTL секунд.
+token_cache = LRUCache(max_items=AUTH_CACHE_ITEMS, ttl=AUTH_CACHE_TTL)
+
+
+def _load_user(user_id):
+    from database import SessionLocal
+    from models import User
+
+    db = SessionLocal()
+    try:
+        # Сессия закрывается, объект остается доступен для чтения загруженных полей
+        return db.get(User, user_id)
+    finally:
+        db.close()
+
+
+def _cached_auth(token: str):
+    """
+    Пользователь токена из token_cache (одно обращение к кэшу); None при промахе
+    """
+    cached = token_cache.get(token)
+    if cached is not None and cached[1] > time.time():
+        return cached[0], None
+    return None
+
+
+def _load_auth(token: str):
+    """
+    Проверка токена и загрузка пользователя из БД; результат кладется в token_cache
+    """
+    try:
+        data = decode_access_token(token)
+        user = _load_user(data.get("user_id"))
+        if user is None:
+            return None, "Пользователь не найден"
+        token_cache.put(token, (user, data["exp"]))
+        return user, None
+    except ExpiredSignatureError:
+        return None, "Сессия истекла"
+    except Exception:
+        return None, "Неверный токен"
+
+
+def _store_auth(request: Request, auth):
+    request.state.auth = auth
+    request.state.user = auth[0]
+    return auth
+
+
+def authenticate(request: Request):
+    """
+    Пользователь запроса по cookie access_token. Результат (пользователь или
+    текст ошибки) сохраняется в request.state, поэтому за запрос токен
+    проверяется один раз, а повторные запросы с тем же токеном берут
+    пользователя из token_cache без обращения к БД.
+    """
+    if hasattr(request.state, "auth"):
+        return request.state.auth
+    token = request.cookies.get("access_token")
+    if not token:
+        return _store_auth(request, (None, "Не авторизован"))
+    return _store_auth(request, _cached_auth(token) or _load_auth(token))
+
+
+async def authenticate_async(request: Request):
+    """
+    authenticate для цикла событий: при промахе кэша проверка токена
+    и запрос в БД выполняются в пуле потоков
+    """
+    if hasattr(request.state, "auth"):
+        return request.state.auth
+    token = request.cookies.get("access_token")
+    if not token:
+        return _store_auth(request, (None, "Не авторизован"))
+    auth = _cached_auth(token) or await run_in_threadpool(_load_auth, token)
+    return _store_auth(request, auth)
+
+
+def get_current_user(request: Request):
+    """
+    Зависимость для защищенных маршрутов: пользователь запроса или 401
+    """
+    user, error = authenticate(request)
+    if user is None:
+        raise HTTPException(401, error)
+    return user
+
+
+def invalidate_token(token: str | None):
+    """
+    Удаление токена из кэша (при выходе)
+    """
+    if token:
+        token_cache.pop(token)
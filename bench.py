@@ -0,0 +1,415 @@
+"""
+Замеры производительности отдельных этапов модели.
+
+Запуск: python bench.py [имя_замера ...]
+Без аргументов выполняются все замеры.
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from predict import DataHandler, Model, NormTable, NORM_COLUMNS, memory_report, t_crit_table
+
+
+def timeit(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def make_exam_csv(path, n_rows=200_000, group_size=12):
+    """
+    Синтетический exam.csv с колонками исходной выгрузки
+    """
+    rng = np.random.default_rng(0)
+    all_count = rng.integers(10, 30, n_rows)
+    teacher_id = rng.integers(1, 2_000, n_rows).astype(float)
+    teacher_id[rng.random(n_rows) < 0.02] = np.nan
+    pd.DataFrame({
+        "academic_group_id": rng.integers(0, n_rows // group_size, n_rows),
+        "session_number": rng.integers(1, 9, n_rows),
+        "exam_number": rng.integers(1, 6, n_rows),
+        "teacher_id": teacher_id,
+        "subject_id": rng.integers(1, 1_500, n_rows),
+        "success_count": (all_count * rng.random(n_rows)).astype(int),
+        "all_count": all_count,
+    }).to_csv(path, index=False)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в Linux — в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_significance(n_groups=50_000, alpha=0.1):
+    """
+    Этап проверки значимости: таблица t_crit_table против вызова stats.t.ppf на группу
+    """
+    rng = np.random.default_rng(0)
+    dof = rng.integers(6, 40, n_groups)
+
+    def per_group_ppf():
+        for d in dof:
+            stats.t.ppf(1 - alpha / 2, d)
+
+    def table_lookup():
+        t_crit_table.lookup(alpha, dof)
+
+    t_crit_table.clear()
+    cold = timeit(table_lookup, repeat=1)
+    print(f"significance: groups={n_groups}")
+    print(f"  stats.t.ppf per group: {timeit(per_group_ppf, repeat=1):.4f} s")
+    print(f"  t_crit_table (cold):   {cold:.6f} s")
+    print(f"  t_crit_table (warm):   {timeit(table_lookup):.6f} s")
+
+
+def bench_outliers(n_rows=1_000_000, group_size=12, percentile=0.9):
+    """
+    Поиск выбросов: маска Model.detect_outliers против цикла по группам
+    """
+    rng = np.random.default_rng(0)
+    results = pd.DataFrame({
+        "academic_group_id": np.sort(rng.integers(0, n_rows // group_size, n_rows)),
+        "error": rng.random(n_rows),
+    })
+
+    def per_group_loop():
+        to_remove = []
+        for _, group_df in results.groupby("academic_group_id"):
+            threshold = group_df["error"].quantile(percentile)
+            to_remove.extend(group_df[group_df["error"] >= threshold].index.tolist())
+        return to_remove
+
+    model = Model.__new__(Model)
+    print(f"outliers: rows={n_rows}")
+    print(f"  loop over groups:   {timeit(per_group_loop, repeat=1):.4f} s")
+    print(f"  grouped transform:  {timeit(lambda: model.detect_outliers(results, percentile)):.4f} s")
+
+
+def _memory_run(mode, path):
+    """
+    Модельная часть /calculate_all в отдельном процессе; печатает пиковый RSS.
+    mode="copy" воспроизводит прежнее поведение, когда groups копировал кадр.
+    """
+    handler = DataHandler(path)
+    if mode == "copy":
+        DataHandler.groups = property(DataHandler.snapshot)
+    base = peak_rss_mb()
+    model = Model(handler, decay=0.9, alpha=0.1)
+    df = model.calculate_all()
+    model.recalculate_with_outliers_removed(df, passes=2)
+    # Прежний /forecast обращался к groups еще трижды
+    for _ in range(3):
+        handler.groups["academic_group_id"]
+    print(f"{base:.1f} {peak_rss_mb():.1f}")
+
+
+def bench_memory(n_rows=1_000_000):
+    """
+    Пиковый RSS расчета при копирующем groups и при доступе без копирования
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "exam.csv")
+        make_exam_csv(path, n_rows)
+        print(f"memory: rows={n_rows}")
+        for mode in ("copy", "view"):
+            out = subprocess.run([sys.executable, __file__, "_memory_run", mode, path],
+                                 capture_output=True, text=True, check=True).stdout.split()
+            base, peak = map(float, out[-2:])
+            print(f"  groups={mode}: handler {base:.1f} MB, peak {peak:.1f} MB (+{peak - base:.1f} MB)")
+
+
+def _load_run(mode, path, n_rows=None):
+    """
+    Создание DataHandler в отдельном процессе; печатает время и прирост пикового RSS.
+    mode="csv" — разбор CSV и подготовка данных, mode="columnar" — из колоночного хранилища,
+    mode="prepare" — генерация exam.csv и запись колоночного хранилища.
+    """
+    if mode == "prepare":
+        make_exam_csv(path, int(n_rows))
+        DataHandler(path)
+        return
+    base = peak_rss_mb()
+    start = time.perf_counter()
+    handler = DataHandler(path, columnar=(mode == "columnar"))
+    elapsed = time.perf_counter() - start
+    # Проход по колонкам, чтобы отображенные страницы попали в RSS
+    for col in handler.groups.columns:
+        handler.column(col).sum()
+    print(f"{elapsed:.4f} {peak_rss_mb() - base:.1f}")
+
+
+def bench_load(n_rows=1_000_000):
+    """
+    Загрузка данных: разбор exam.csv против колоночного хранилища (np.memmap).
+    Все шаги — в отдельных процессах: пиковый RSS наследуется дочерним процессом.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "exam.csv")
+        subprocess.run([sys.executable, __file__, "_load_run", "prepare", path, str(n_rows)], check=True)
+        print(f"load: rows={n_rows}")
+        for mode in ("csv", "columnar"):
+            out = subprocess.run([sys.executable, __file__, "_load_run", mode, path],
+                                 capture_output=True, text=True, check=True).stdout.split()
+            elapsed, rss = map(float, out[-2:])
+            print(f"  {mode:8}: {elapsed:.4f} s, +{rss:.1f} MB RSS")
+
+
+def bench_dtypes(n_rows=1_000_000):
+    """
+    Байт на строку данных DataHandler: прежние int64/float64, компактная схема
+    и компактная схема с идентификаторами-category
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "exam.csv")
+        make_exam_csv(path, n_rows)
+        compact = DataHandler(path, columnar=False)
+        categorical = DataHandler(path, columnar=False, categorical_ids=True)
+    wide = compact.snapshot()
+    wide = wide.astype({col: "float64" if wide[col].hasnans or wide[col].dtype.kind == "f" else "int64"
+                        for col in wide.columns})
+    print(f"dtypes: rows={n_rows}")
+    for name, report in (("int64/float64", memory_report(wide)),
+                         ("compact", compact.memory_report()),
+                         ("compact + category ids", categorical.memory_report())):
+        print(f"  {name:23}: {report['bytes_per_row']:.1f} bytes/row, {report['bytes'] / 2**20:.1f} MB")
+    for col, info in compact.memory_report()["columns"].items():
+        print(f"    {col:23} {info['dtype']:8} {info['bytes_per_row']:.1f}")
+
+
+def bench_norms(n_rows=1_000_000, n_lookups=1_000):
+    """
+    Взвешенные нормы: прежние groupby + pd.merge против таблиц NormTable
+    (factorize + bincount и выборка по кодам), поиск нормы преподавателя
+    сканированием колонки против таблицы
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "exam.csv")
+        make_exam_csv(path, n_rows)
+        handler = DataHandler(path, columnar=False)
+    frame = handler.snapshot().drop(columns=list(NORM_COLUMNS.values()))
+
+    def merge():
+        df = frame
+        for key, name in NORM_COLUMNS.items():
+            grouped = df.groupby(key).agg({"students_failed": "sum", "all_count": "sum"}).reset_index()
+            grouped[name] = grouped["students_failed"] / grouped["all_count"]
+            df = pd.merge(df, grouped[[key, name]], on=key, how="left")
+        return df
+
+    def tables():
+        df = frame.copy(deep=False)
+        failed, total = (df[col].to_numpy(dtype=float) for col in ("students_failed", "all_count"))
+        for key, name in NORM_COLUMNS.items():
+            table, codes = NormTable.aggregate(df[key].to_numpy(dtype=float, na_value=np.nan), failed, total)
+            df[name] = table.gather(codes)
+        return df
+
+    teachers = handler.examiner_norms.ids.to_numpy()[:n_lookups]
+    data = handler.groups
+
+    def scan():
+        for tid in teachers.tolist():
+            data.loc[data["teacher_id"] == tid, "examiner_weighted_norm"].iloc[0]
+
+    def lookup():
+        for tid in teachers.tolist():
+            handler.examiner_norms.get(tid)
+
+    print(f"norms: rows={n_rows}")
+    print(f"  groupby + merge: {timeit(merge, repeat=3):.4f} s")
+    print(f"  NormTable:       {timeit(tables, repeat=3):.4f} s")
+    print(f"  {len(teachers)} teacher lookups: scan {timeit(scan, repeat=1):.4f} s, "
+          f"table {timeit(lookup, repeat=3):.6f} s")
+
+
+def bench_charts(n_groups=200, group_size=12, workers=None):
+    """
+    Графики в секунду: прежний цикл через pyplot против render_all (Figure/FigureCanvasAgg)
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from io import BytesIO
+    from scipy.interpolate import make_interp_spline
+    from charts import pack_series, render_all
+
+    rng = np.random.default_rng(0)
+    n_rows = n_groups * group_size
+    results = pd.DataFrame({
+        "academic_group_id": np.repeat(np.arange(n_groups), group_size),
+        "group_performance": rng.random(n_rows),
+        "yp": rng.random(n_rows),
+    })
+    workers = workers or os.cpu_count()
+
+    def pyplot_loop():
+        for gid, group_df in results.groupby("academic_group_id"):
+            exam_nums = np.arange(1, len(group_df) + 1)
+            fig, ax = plt.subplots(figsize=(6, 4))
+            x_smooth = np.linspace(exam_nums.min(), exam_nums.max(), 300)
+            ax.plot(x_smooth, make_interp_spline(exam_nums, group_df["group_performance"], k=3)(x_smooth))
+            ax.plot(x_smooth, make_interp_spline(exam_nums, group_df["yp"], k=3)(x_smooth))
+            ax.set_title(f"Группа {gid}")
+            ax.legend(["Реальные", "Предсказанные"])
+            buf = BytesIO()
+            plt.savefig(buf, format="png")
+            plt.close(fig)
+
+    series = pack_series(results)
+    # Первый запуск пула поднимает процессы; в замер он не входит
+    render_all(*series, workers=workers)
+    print(f"charts: groups={n_groups}")
+    print(f"  pyplot loop:             {n_groups / timeit(pyplot_loop, repeat=1):.1f} charts/s")
+    print(f"  render_all (1 worker):   {n_groups / timeit(lambda: render_all(*series), repeat=1):.1f} charts/s")
+    print(f"  render_all ({workers} workers): "
+          f"{n_groups / timeit(lambda: render_all(*series, workers=workers), repeat=1):.1f} charts/s")
+
+
+def bench_groups(n_groups=2_000, n_requests=1_000, concurrency=50):
+    """
+    Нагрузочный тест /groups: запросов в секунду при `concurrency` одновременных
+    запросах. Прежний вариант (синхронная сессия, ORM-объекты) против асинхронного
+    (aiosqlite, только нужные колонки, весь список одной страницей).
+    Приложение работает в том же процессе.
+    """
+    import asyncio
+    import httpx
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import insert
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp, "bench.db")
+        import database
+        import models
+        from auth import get_current_user
+        from routers.getdata_router import getdata_router
+
+        database.Base.metadata.create_all(database.engine)
+        with database.SessionLocal() as db:
+            db.add(models.User(id=1))
+            db.flush()
+            db.execute(insert(models.Group), [
+                {"id": i, "user_id": 1, "title": f"Группа {i}", "start_year": 2020} for i in range(n_groups)])
+            db.commit()
+
+        app = FastAPI()
+        app.include_router(getdata_router)
+        user = models.User(id=1)
+        app.dependency_overrides[get_current_user] = lambda: user
+
+        @app.get("/groups_sync")
+        def groups_sync(db=Depends(database.get_db)):
+            items = db.query(models.Group).filter(models.Group.user_id == user.id).all()
+            return [{"id": g.id, "title": g.title} for g in items]
+
+        async def load(path):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                limit = asyncio.Semaphore(concurrency)
+
+                async def one():
+                    async with limit:
+                        (await client.get(path)).raise_for_status()
+
+                await one()
+                start = time.perf_counter()
+                await asyncio.gather(*(one() for _ in range(n_requests)))
+                return time.perf_counter() - start
+
+        async def run():
+            try:
+                return await load("/groups_sync"), await load(f"/groups?limit={n_groups}")
+            finally:
+                await database.async_engine.dispose()
+
+        sync_time, async_time = asyncio.run(run())
+        database.engine.dispose()
+
+    print(f"groups: rows={n_groups}, requests={n_requests}, concurrency={concurrency}")
+    print(f"  sync session, ORM objects:  {n_requests / sync_time:.1f} req/s")
+    print(f"  async session, columns:     {n_requests / async_time:.1f} req/s")
+
+
+def _free_port() -> int:
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_startup(repeat=3, timeout=60):
+    """
+    Время до первого ответа /info: от запуска процесса uvicorn до ответа 200.
+    eager — модули расчета импортируются до запуска приложения (как раньше),
+    lazy — при первом использовании, lazy+warmup — в фоне из lifespan.
+    """
+    import urllib.request
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    eager = "import predict, charts, tracing, ingest, uvicorn, sys; " \
+            "uvicorn.run('main:app', port=int(sys.argv[1]), log_level='warning')"
+    lazy = "import uvicorn, sys; uvicorn.run('main:app', port=int(sys.argv[1]), log_level='warning')"
+    modes = {"eager": (eager, "0"), "lazy": (lazy, "0"), "lazy+warmup": (lazy, "1")}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.symlink(os.path.join(root, "frontend"), os.path.join(tmp, "frontend"))
+        env = {**os.environ, "PYTHONPATH": root,
+               "DATABASE_URL": "sqlite:///" + os.path.join(tmp, "bench.db")}
+        print(f"startup: time to first /info response, best of {repeat}")
+        for mode, (code, warmup) in modes.items():
+            best = float("inf")
+            for _ in range(repeat):
+                port = _free_port()
+                start = time.perf_counter()
+                server = subprocess.Popen([sys.executable, "-c", code, str(port)], cwd=tmp,
+                                          env={**env, "WARMUP": warmup})
+                try:
+                    while time.perf_counter() - start < timeout:
+                        try:
+                            with urllib.request.urlopen(f"http://127.0.0.1:{port}/info") as resp:
+                                if resp.status == 200:
+                                    break
+                        except OSError:
+                            time.sleep(0.01)
+                    best = min(best, time.perf_counter() - start)
+                finally:
+                    server.terminate()
+                    server.wait()
+            print(f"  {mode:12}: {best:.3f} s")
+
+
+BENCHMARKS = {
+    "significance": bench_significance,
+    "outliers": bench_outliers,
+    "memory": bench_memory,
+    "charts": bench_charts,
+    "load": bench_load,
+    "dtypes": bench_dtypes,
+    "norms": bench_norms,
+    "groups": bench_groups,
+    "startup": bench_startup,
+}
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["_memory_run"]:
+        _memory_run(*sys.argv[2:4])
+        sys.exit()
+    if sys.argv[1:2] == ["_load_run"]:
+        _load_run(*sys.argv[2:5])
+        sys.exit()
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,274 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from config import (HANDLER_CACHE_ITEMS, HANDLER_CACHE_MAX_BYTES, HANDLER_CACHE_TTL,
+                    REFERENCE_CACHE_MAX_BYTES)
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from predict import DataHandler
+
+
+class LRUCache():
+    """
+    Потокобезопасный LRU-кэш с ограничением по числу элементов,
+    суммарному размеру (в байтах, по функции `sizeof`) и времени жизни.
+    Для вытесненных по лимитам элементов вызывается on_evict(key, value).
+    """
+    def __init__(self, max_items=None, max_bytes=None, ttl=None, sizeof=None, on_evict=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 0)
+        self.on_evict = on_evict
+        self._data: OrderedDict = OrderedDict()  # key -> (value, size, expires)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[2] is not None and item[2] < time.monotonic():
+                self._remove(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, expires)
+            self._bytes += size
+            evicted = self._evict()
+        # Вне блокировки: обработчик может работать с диском
+        if self.on_evict is not None:
+            for item in evicted:
+                self.on_evict(*item)
+
+    def pop(self, key, default=None):
+        """
+        Удаление элемента по ключу; возвращает его значение или default
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            self._remove(key)
+            return item[0]
+
+    def discard(self, predicate):
+        """
+        Удаление всех элементов, для ключей которых predicate(key) истинно
+        """
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "items": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def _evict(self) -> list:
+        """
+        Вытеснение старых элементов сверх лимитов; возвращает [(key, value)]
+        """
+        evicted = []
+        # Последний добавленный элемент остается, даже если один превышает лимит
+        while len(self._data) > 1 and (
+            (self.max_items is not None and len(self._data) > self.max_items)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._data))
+            evicted.append((key, self._data[key][0]))
+            self._remove(key)
+            self.evictions += 1
+        return evicted
+
+
+def file_fingerprint(path) -> tuple:
+    """
+    Отпечаток файла для ключей кэша: путь, время изменения и размер
+    """
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+class ResultMemo():
+    """
+    Мемоизация результатов расчета (DataFrame) по ключу из версии данных и параметров модели.
+    Результаты держатся в LRU-кэше и, если задан `spill_dir`, сохраняются на диск
+    по колонкам (см. ColumnStore) до вытеснения из кэша.
+    Одновременные запросы с одним ключом ждут один расчет.
+    """
+    def __init__(self, max_items=8, max_bytes=None, spill_dir=None):
+        self.cache = LRUCache(max_items=max_items, max_bytes=max_bytes,
+                              sizeof=lambda df: int(df.memory_usage(deep=True).sum()),
+                              on_evict=self._evicted)
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self._flights: dict = {}  # key -> threading.Event
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Результат из памяти или с диска; None, если его нет
+        """
+        df = self.cache.get(key)
+        if df is None and self.spill_dir is not None:
+            df = self._load(key)
+            if df is not None:
+                self.cache.put(key, df)
+        return df
+
+    def put(self, key, df: "pd.DataFrame"):
+        self.cache.put(key, df)
+        if self.spill_dir is not None:
+            self._save(key, df)
+
+    def compute_events(self, key, events, cached=None):
+        """
+        Генератор событий с результатом по ключу; при промахе результат считает
+        генератор events(), и его события отдаются дальше. Пока один поток считает,
+        остальные с тем же ключом ждут его результат. Если результат взят из памяти
+        или с диска, отдается событие `cached` (если задано).
+        """
+        while True:
+            df = self.get(key)
+            if df is not None:
+                if cached is not None:
+                    yield cached
+                return df
+            with self._lock:
+                flight = self._flights.get(key)
+                owner = flight is None
+                if owner:
+                    flight = self._flights[key] = threading.Event()
+            if not owner:
+                flight.wait()
+                # Если расчет упал или был прерван, следующий поток попробует сам
+                continue
+            try:
+                df = yield from events()
+                self.put(key, df)
+                return df
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.set()
+
+    def _name(self, key) -> str:
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def _load(self, key):
+        from columnar import ColumnStore
+
+        return ColumnStore(self.spill_dir).load(self._name(key))
+
+    def _save(self, key, df: "pd.DataFrame"):
+        from columnar import ColumnStore
+
+        ColumnStore(self.spill_dir).save(self._name(key), df, prune=False)
+
+    def _evicted(self, key, df):
+        if self.spill_dir is not None:
+            from columnar import ColumnStore
+
+            ColumnStore(self.spill_dir).remove(self._name(key))
+
+
+# Общий кэш DataHandler: сессии, читающие одни и те же данные, используют один объект
+handler_cache = LRUCache(
+    max_items=HANDLER_CACHE_ITEMS,
+    max_bytes=HANDLER_CACHE_MAX_BYTES,
+    ttl=HANDLER_CACHE_TTL,
+    sizeof=lambda handler: handler.memory_usage(),
+)
+_handler_lock = threading.Lock()
+
+
+def get_data_handler(path="uploads/exam.csv"):
+    """
+    DataHandler для файла `path` из общего кэша.
+    Ключ — отпечаток файла, поэтому после загрузки новых данных
+    создается новый обработчик, а старый вытесняется.
+    Версия обработчика — хэш содержимого, так что повторная загрузка
+    тех же данных сохраняет версию (и кэши результатов и графиков).
+    """
+    from columnar import content_hash
+    from predict import DataHandler
+
+    key = file_fingerprint(path)
+    handler = handler_cache.get(key)
+    if handler is not None:
+        return handler
+    # Один поток строит обработчик, остальные ждут и берут его из кэша
+    with _handler_lock:
+        handler = handler_cache.get(key)
+        if handler is None:
+            handler = DataHandler(path=path, version=content_hash(path))
+            handler_cache.discard(lambda k: k[0] == key[0] and k != key)
+            handler_cache.put(key, handler)
+    return handler
+
+
+def exam_handler() -> "DataHandler":
+    """
+    Зависимость маршрутов: обработчик uploads/exam.csv, общий для всех сессий
+    с одними и теми же данными
+    """
+    return get_data_handler("uploads/exam.csv")
+
+
+# Страницы справочников пользователя: (user_id, поколение, справочник, after, limit) -> страница.
+# Страница — (JSON-тело, ETag, курсор следующей страницы или None)
+reference_cache = LRUCache(max_bytes=REFERENCE_CACHE_MAX_BYTES, sizeof=lambda page: len(page[0]))
+_reference_generations: dict = {}  # user_id -> поколение справочников
+_reference_lock = threading.Lock()
+
+
+def reference_generation(user_id) -> int:
+    """
+    Текущее поколение справочников пользователя (часть ключа кэша)
+    """
+    with _reference_lock:
+        return _reference_generations.get(user_id, 0)
+
+
+def invalidate_reference_data(user_id):
+    """
+    Сброс кэша справочников пользователя после импорта данных.
+    Поколение увеличивается, поэтому страница, которую параллельный запрос
+    прочитал до импорта, не попадет в кэш под новым ключом.
+    """
+    with _reference_lock:
+        _reference_generations[user_id] = _reference_generations.get(user_id, 0) + 1
+    reference_cache.discard(lambda key: key[0] == user_id)
@@ -0,0 +1,111 @@
+import threading
+import zipfile
+from io import BytesIO
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from scipy.interpolate import make_interp_spline
+
+# Одна фигура на поток: pyplot не используется, фигура очищается перед каждым графиком
+_local = threading.local()
+
+
+def _figure() -> Figure:
+    fig = getattr(_local, "figure", None)
+    if fig is None:
+        fig = Figure(figsize=(6, 4))
+        FigureCanvasAgg(fig)
+        _local.figure = fig
+    fig.clear()
+    return fig
+
+
+def render_group_chart(group_id, actual, predicted) -> bytes:
+    """
+    PNG-график реальной и предсказанной успеваемости группы по экзаменам
+    """
+    # Ряды приводятся к float32, как в pack_series, чтобы одиночный
+    # и пакетный графики группы совпадали побайтно
+    actual = np.asarray(actual, dtype=np.float32).astype(float)
+    predicted = np.asarray(predicted, dtype=np.float32).astype(float)
+    exam_nums = np.arange(1, len(actual) + 1)
+
+    fig = _figure()
+    ax = fig.add_subplot()
+    try:
+        x_smooth = np.linspace(exam_nums.min(), exam_nums.max(), 300)
+        spl_act = make_interp_spline(exam_nums, actual, k=3)
+        spl_pred = make_interp_spline(exam_nums, predicted, k=3)
+        ax.plot(x_smooth, spl_act(x_smooth), label='Реальные')
+        ax.plot(x_smooth, spl_pred(x_smooth), label='Предсказанные')
+    except ValueError:
+        ax.plot(exam_nums, actual, marker='o', label='Реальные', color="green")
+        ax.plot(exam_nums, predicted, marker='o', label='Предсказанные')
+    ax.set_xlabel('Экзамены')
+    ax.set_ylabel('Успеваемость')
+    ax.set_title(f'Группа {group_id}')
+    ax.legend()
+
+    buf = BytesIO()
+    fig.canvas.print_png(buf)
+    return buf.getvalue()
+
+
+def pack_series(results) -> tuple:
+    """
+    Ряды всех групп результата в компактном виде: id групп, смещения
+    и две колонки float32 (group_performance, yp). Строки отсортированы по группам.
+    """
+    ids = results['academic_group_id'].to_numpy(dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else np.array([], dtype=int)
+    offsets = np.append(starts, len(ids))
+    actual = results['group_performance'].to_numpy(dtype=np.float32)
+    predicted = results['yp'].to_numpy(dtype=np.float32)
+    return ids[starts], offsets, actual, predicted
+
+
+def render_series(group_ids, offsets, actual, predicted) -> list[bytes]:
+    """
+    Графики набора групп по упакованным рядам (см. pack_series)
+    """
+    return [
+        render_group_chart(gid, actual[offsets[i]:offsets[i + 1]], predicted[offsets[i]:offsets[i + 1]])
+        for i, gid in enumerate(group_ids.tolist())
+    ]
+
+
+def render_all(group_ids, offsets, actual, predicted, workers=1) -> list[bytes]:
+    """
+    Графики всех групп; при workers > 1 — в пуле процессов.
+    Каждой задаче передается только срез упакованных рядов своих групп.
+    """
+    n = len(group_ids)
+    if workers <= 1 or n < 2 * workers:
+        return render_series(group_ids, offsets, actual, predicted)
+
+    from predict import get_executor
+
+    bounds = np.linspace(0, n, min(n, workers * 4) + 1).astype(int)
+    executor = get_executor(workers)
+    futures = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        row_lo, row_hi = offsets[lo], offsets[hi]
+        futures.append(executor.submit(
+            render_series, group_ids[lo:hi], offsets[lo:hi + 1] - row_lo,
+            actual[row_lo:row_hi], predicted[row_lo:row_hi]))
+    pngs = []
+    for future in futures:
+        pngs.extend(future.result())
+    return pngs
+
+
+def charts_archive(group_ids, pngs) -> bytes:
+    """
+    ZIP-архив графиков (PNG уже сжаты, поэтому без повторного сжатия)
+    """
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as archive:
+        for gid, png in zip(group_ids.tolist(), pngs):
+            archive.writestr(f"group_{gid}.png", png)
+    return buf.getvalue()
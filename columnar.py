@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def file_hash(path, chunk_size=1 << 20) -> str:
+    """
+    Хэш содержимого файла (sha1, первые 16 символов) — версия данных
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+@contextmanager
+def atomic_write(path, mode="w", **kwargs):
+    """
+    Запись файла целиком: данные пишутся во временный файл рядом с `path`
+    и атомарно заменяют его (os.replace) при выходе из блока без ошибок,
+    поэтому читатель никогда не видит наполовину записанный файл
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _hash_sidecar(path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + ".sha1")
+
+
+def write_hash(path, digest: str):
+    """
+    Сохранение хэша содержимого рядом с файлом (uploads/exam.csv.sha1)
+    вместе с размером и временем изменения файла
+    """
+    st = os.stat(path)
+    with atomic_write(_hash_sidecar(path)) as f:
+        f.write(f"{digest} {st.st_mtime_ns} {st.st_size}")
+
+
+def content_hash(path) -> str:
+    """
+    Хэш содержимого файла: из файла-спутника, если файл с тех пор
+    не менялся, иначе считается заново (см. file_hash)
+    """
+    st = os.stat(path)
+    try:
+        digest, mtime_ns, size = _hash_sidecar(path).read_text().split()
+        if int(mtime_ns) == st.st_mtime_ns and int(size) == st.st_size:
+            return digest
+    except (FileNotFoundError, ValueError):
+        pass
+    return file_hash(path)
+
+
+class ColumnStore():
+    """
+    Колоночное хранилище кадра на диске: каждая колонка — отдельный .npy файл.
+    Версии хранятся в подкаталогах по тегу (например, хэш исходного файла),
+    при загрузке колонки отображаются в память только для чтения.
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    @classmethod
+    def for_file(cls, path) -> "ColumnStore":
+        """
+        Хранилище рядом с исходным файлом: uploads/exam.csv -> uploads/exam.cols/
+        """
+        return cls(Path(path).with_suffix(".cols"))
+
+    def load(self, tag: str):
+        """
+        Кадр версии `tag` без копирования (колонки — np.memmap в режиме "r");
+        None, если такой версии нет
+        """
+        version_dir = self.directory / tag
+        try:
+            with (version_dir / "columns.json").open(encoding="utf-8") as f:
+                columns = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        def array(name):
+            return np.load(version_dir / name, mmap_mode="r").view(np.ndarray)
+
+        data = {}
+        for i, column in enumerate(columns):
+            values = array(f"{i}.npy")
+            if column["masked"]:
+                # Целые с пропусками: значения и маска пропусков
+                values = pd.arrays.IntegerArray(values, array(f"{i}.mask.npy"))
+            data[column["name"]] = values
+        return pd.DataFrame(data, copy=False)
+
+    def save(self, tag: str, frame: pd.DataFrame, prune=True) -> bool:
+        """
+        Сохранение кадра как версии `tag`; при prune остальные версии удаляются.
+        Версия пишется во временный каталог и переименовывается целиком,
+        поэтому читатель никогда не видит ее наполовину записанной.
+        Кадры с нечисловыми колонками (кроме целых с пропусками) не сохраняются
+        (возвращается False).
+        """
+        if any(dtype.kind not in "biuf" or isinstance(dtype, pd.CategoricalDtype) for dtype in frame.dtypes):
+            return False
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+        try:
+            columns = []
+            for i, col in enumerate(frame.columns):
+                values = frame[col].array
+                masked = isinstance(values, pd.arrays.IntegerArray)
+                if masked:
+                    np.save(os.path.join(tmp, f"{i}.mask.npy"), np.asarray(values.isna()))
+                    values = values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0)
+                np.save(os.path.join(tmp, f"{i}.npy"), np.asarray(values))
+                columns.append({"name": str(col), "masked": masked})
+            with open(os.path.join(tmp, "columns.json"), "w", encoding="utf-8") as f:
+                json.dump(columns, f, ensure_ascii=False)
+            try:
+                os.rename(tmp, self.directory / tag)
+            except OSError:
+                # Эту версию уже записал другой процесс
+                shutil.rmtree(tmp, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        if prune:
+            self.prune(keep=tag)
+        return True
+
+    def remove(self, tag: str):
+        """
+        Удаление версии `tag`, если она есть
+        """
+        shutil.rmtree(self.directory / tag, ignore_errors=True)
+
+    def prune(self, keep: str):
+        """
+        Удаление всех версий, кроме `keep`. Уже отображенные в память
+        колонки удаленных версий остаются доступны до закрытия.
+        """
+        for entry in self.directory.iterdir():
+            if entry.name != keep and not entry.name.startswith(".tmp-"):
+                shutil.rmtree(entry, ignore_errors=True)
@@ -2,5 +2,51 @@
 from fastapi.templating import Jinja2Templates
 
 from pathlib import Path
+import os
 
 templates = Jinja2Templates(directory="frontend/templates")
+
+# Число процессов для расчета модели (1 — без пула процессов)
+FIT_WORKERS = int(os.getenv("FIT_WORKERS", "1"))
+
+# Файл отладочной трассировки групп модели (пусто — трассировка отключена)
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+# Общий кэш DataHandler: число элементов, лимит памяти (байт) и время жизни (сек)
+HANDLER_CACHE_ITEMS = int(os.getenv("HANDLER_CACHE_ITEMS", "4"))
+HANDLER_CACHE_MAX_BYTES = int(os.getenv("HANDLER_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+HANDLER_CACHE_TTL = float(os.getenv("HANDLER_CACHE_TTL", "3600"))
+
+# Лимит памяти кэша PNG-графиков групп (байт)
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Число процессов для пакетной отрисовки графиков (1 — без пула процессов)
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "1"))
+
+# Фоновые расчеты: число потоков, лимит очереди и каталог готовых результатов
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "8"))
+RESULTS_DIR = os.getenv("RESULTS_DIR", "results")
+
+# Мемоизация результатов расчета: число элементов, лимит памяти (байт)
+# и каталог для сохранения на диск (пусто — только память)
+RESULT_CACHE_ITEMS = int(os.getenv("RESULT_CACHE_ITEMS", "8"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+RESULT_SPILL_DIR = os.getenv("RESULT_SPILL_DIR", "")
+
+# Кэш авторизации (токен -> пользователь): число токенов и время жизни (сек)
+AUTH_CACHE_ITEMS = int(os.getenv("AUTH_CACHE_ITEMS", "1024"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+
+# Кэш справочников (/groups, /teachers, /subjects): лимит памяти (байт),
+# размер страницы по умолчанию и максимальный
+REFERENCE_CACHE_MAX_BYTES = int(os.getenv("REFERENCE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+REFERENCE_PAGE_SIZE = int(os.getenv("REFERENCE_PAGE_SIZE", "1000"))
+REFERENCE_PAGE_MAX = int(os.getenv("REFERENCE_PAGE_MAX", "5000"))
+
+# Предзагрузка модулей расчета (pandas, scipy, matplotlib) в фоне при запуске
+# приложения: первый расчет не ждет импорта, а запуск не замедляется
+WARMUP = os.getenv("WARMUP", "1") == "1"
+
+# Верхняя граница числа проходов удаления выбросов в параметрах запросов
+MAX_OUTLIER_PASSES = int(os.getenv("MAX_OUTLIER_PASSES", "5"))
@@ -1,13 +1,70 @@
+import os
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-DATABASE_URL = "postgresql://postgres:1@localhost/webpredict"
-engine = create_engine(DATABASE_URL)
+# Для тестов можно указать SQLite, например DATABASE_URL=sqlite:///test.db
+# Таблицы при импорте не создаются: схема — отдельным шагом (python manage.py create-db)
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:1@localhost/webpredict")
+
+# Пул соединений: постоянные соединения, сверх них при пиковой нагрузке,
+# ожидание свободного соединения (сек) и пересоздание старых соединений (сек)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Асинхронные драйверы для синхронных URL
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_url(url: str) -> str:
+    """
+    URL асинхронного движка для того же сервера БД
+    """
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)) \
+        .render_as_string(hide_password=False)
+
+
+def pool_options(url: str) -> dict:
+    """
+    Параметры пула; для SQLite размер пула не задается (используется пул драйвера)
+    """
+    options = {"pool_pre_ping": True}
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                       pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE)
+    return options
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_url(DATABASE_URL)
+
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-Base.metadata.drop_all(bind=engine)
 
-# Потом создаём их заново уже с новыми типами (BigInteger и т.п.)
-Base.metadata.create_all(bind=engine)
+def get_db():
+    """
+    Синхронная сессия БД на запрос (общая зависимость роутеров)
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    """
+    Асинхронная сессия БД на запрос
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
@@ -87,23 +87,45 @@ async function PrintData() {
 async function StartAlg() {
   PrintData();
   console.log("Запуск алгоритма");
+  const container = document.getElementById("groups");
+  const status = document.getElementById("upload_message");
+  if (!container) {
+    console.error('Элемент с id "groups" не найден.');
+    return;
+  }
+  container.innerHTML = "";
+  calculatedGroups = {};
   try {
-    const response = await fetch("/calculate_all");
-    const data = await response.json();
-
-    calculatedGroups = {};
-    Object.keys(data).forEach(key => {
-      const group = data[key];
-      calculatedGroups[group.id] = group;
-    });
-
-    PrintGroups(data);
-    console.log("Response:", data);
+    // Результаты приходят построчно (NDJSON): прогресс, затем группы
+    const response = await fetch("/calculate_all?stream=true");
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+      lines.filter(line => line.trim()).forEach(line => HandleEvent(JSON.parse(line), container, status));
+    }
+    if (buffer.trim()) HandleEvent(JSON.parse(buffer), container, status);
   } catch (error) {
     console.error("Ошибка при выполнении запроса:", error);
   }
 }
 
+function HandleEvent(event, container, status) {
+  if (event.type === "progress") {
+    if (status) status.textContent = `Расчет: этап ${event.done} из ${event.total}`;
+  } else if (event.type === "group") {
+    calculatedGroups[event.id] = event;
+    AppendGroup(event, container);
+  } else if (event.type === "done") {
+    if (status) status.textContent = `Готово, групп: ${event.groups}`;
+  }
+}
+
 async function PrintGroups(data) {
   const container = document.getElementById("groups");
   if (!container) {
@@ -111,27 +133,28 @@ async function PrintGroups(data) {
     return;
   }
   container.innerHTML = "";
-  Object.keys(data).forEach(key => {
-    const groupData = data[key];
-    if (!groupData || typeof groupData !== "object") return;
-    const newGroupItem = document.createElement("div");
-    newGroupItem.classList.add("group-item");
-
-    const label = document.createElement("label");
-    label.textContent = `номер группы ${groupData.id}, ошибка ${groupData.error}`;
-    newGroupItem.appendChild(label);
-
-    const btn = document.createElement("button");
-    btn.type = "button";
-    btn.classList.add("show-button");
-    btn.textContent = "-";
-    btn.addEventListener("click", function() {
-      ShowGroupPlot(groupData.id);
-    });
-    newGroupItem.appendChild(btn);
-
-    container.appendChild(newGroupItem);
+  Object.keys(data).forEach(key => AppendGroup(data[key], container));
+}
+
+function AppendGroup(groupData, container) {
+  if (!groupData || typeof groupData !== "object") return;
+  const newGroupItem = document.createElement("div");
+  newGroupItem.classList.add("group-item");
+
+  const label = document.createElement("label");
+  label.textContent = `номер группы ${groupData.id}, ошибка ${groupData.error}`;
+  newGroupItem.appendChild(label);
+
+  const btn = document.createElement("button");
+  btn.type = "button";
+  btn.classList.add("show-button");
+  btn.textContent = "-";
+  btn.addEventListener("click", function() {
+    ShowGroupPlot(groupData.id);
   });
+  newGroupItem.appendChild(btn);
+
+  container.appendChild(newGroupItem);
 }
 
 async function ShowGroupPlot(group_id) {
@@ -139,9 +162,8 @@ async function ShowGroupPlot(group_id) {
   try {
     const container = document.getElementById("load-plot");
     container.innerHTML = "";
-    const imgSrc = calculatedGroups[group_id]['img'];
     const img = document.createElement('img');
-    img.src = `data:image/png;base64,${imgSrc}`;
+    img.src = calculatedGroups[group_id]['img'];
     img.classList.add("img-fluid");
     container.appendChild(img);
     console.log("Изображение добавлено");
@@ -0,0 +1,225 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Float, cast, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from columnar import content_hash, write_hash
+
+# Размер блока при сохранении загруженных файлов
+CHUNK_SIZE = 1024 * 1024
+
+# Размер пачки строк для executemany
+BATCH_SIZE = 10_000
+
+# Число строк, получаемых с сервера за раз при чтении экзаменов
+FETCH_SIZE = 50_000
+
+EXAM_COLUMNS = ["academic_group_id", "teacher_id", "subject_id",
+                "session_number", "exam_number", "success_count", "all_count"]
+
+
+def save_upload(src, target: Path) -> dict:
+    """
+    Потоковое сохранение загруженного файла: `src` читается блоками по CHUNK_SIZE
+    во временный файл рядом с `target`, по пути считаются хэш и число строк.
+    Готовый файл атомарно заменяет `target`. Если содержимое совпадает
+    с уже загруженным, временный файл удаляется, а `target` не трогается (unchanged).
+    """
+    digest = hashlib.sha1()
+    size = lines = 0
+    last = b"\n"
+    fd, tmp = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                size += len(chunk)
+                lines += chunk.count(b"\n")
+                last = chunk[-1:]
+                f.write(chunk)
+        sha1 = digest.hexdigest()[:16]
+        unchanged = target.exists() and content_hash(target) == sha1
+        if unchanged:
+            os.unlink(tmp)
+        else:
+            os.replace(tmp, target)
+        write_hash(target, sha1)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    # Строки без заголовка; последняя строка может быть без перевода строки
+    rows = max(lines + (last != b"\n") - 1, 0)
+    return {"file": target.name, "sha1": sha1, "bytes": size, "rows": rows, "unchanged": unchanged}
+
+
+def read_csv_text(path: Path) -> pd.DataFrame:
+    """
+    CSV целиком как строки без пробелов по краям; пустые и отсутствующие значения — ""
+    """
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8")
+    return df.fillna("").apply(lambda col: col.str.strip())
+
+
+def column(df: pd.DataFrame, name: str) -> pd.Series:
+    """
+    Колонка кадра или пустые строки, если колонки нет
+    """
+    return df[name] if name in df.columns else pd.Series("", index=df.index)
+
+
+def parse_ints(values: pd.Series) -> pd.Series:
+    """
+    Целые из строк; пустые, NULL и нечисловые значения — пропуски (Int64)
+    """
+    valid = values.str.fullmatch(r"[+-]?\d+")
+    return pd.to_numeric(values.where(valid), errors="coerce").astype("Int64")
+
+
+async def existing_ids(db: AsyncSession, model, user_id) -> set:
+    """
+    Идентификаторы уже загруженных пользователем записей — один запрос на таблицу
+    """
+    return set(await db.scalars(select(model.id).where(model.user_id == user_id)))
+
+
+def new_rows(ids: pd.Series, known: set) -> pd.Series:
+    """
+    Маска строк с корректным новым id: без пропусков, не в known и без повторов в файле
+    """
+    return ids.notna() & ~ids.isin(known) & ~ids.duplicated()
+
+
+def group_rows(df: pd.DataFrame, user_id, known: set) -> pd.DataFrame:
+    """
+    Новые группы из group.csv
+    """
+    ids = parse_ints(column(df, "id"))
+    new = new_rows(ids, known)
+    return pd.DataFrame({
+        "id": ids[new],
+        "user_id": user_id,
+        "title": column(df, "title")[new],
+        "start_year": parse_ints(column(df, "start_year"))[new].fillna(0),
+    })
+
+
+def subject_rows(df: pd.DataFrame, user_id, known: set) -> pd.DataFrame:
+    """
+    Новые предметы из subject.csv
+    """
+    ids = parse_ints(column(df, "id"))
+    new = new_rows(ids, known)
+    title = column(df, "title")[new]
+    return pd.DataFrame({"id": ids[new], "user_id": user_id, "title": title, "short_title": title})
+
+
+def teacher_rows(df: pd.DataFrame, user_id, known: set) -> pd.DataFrame:
+    """
+    Новые преподаватели из teacher.csv (id из колонки id или teacher_id)
+    """
+    raw = column(df, "id")
+    ids = parse_ints(raw.where(raw != "", column(df, "teacher_id")))
+    new = new_rows(ids, known)
+    return pd.DataFrame({
+        "id": ids[new],
+        "user_id": user_id,
+        "first_name": column(df, "firstname")[new],
+        "last_name": column(df, "lastname")[new],
+        "patronymic": column(df, "patronymic")[new],
+    })
+
+
+def exam_rows(df: pd.DataFrame, user_id, group_ids: set, teacher_ids: set, subject_ids: set):
+    """
+    Экзамены из exam.csv, которые можно вставить. Строки с пустыми или NULL
+    значениями и со ссылками на неизвестные группы, преподавателей
+    и предметы пропускаются. Возвращает кадр экзаменов, номера строк
+    с неверным форматом числа и число строк с неизвестными ссылками.
+    """
+    raw = df[EXAM_COLUMNS]
+    empty = (raw.eq("") | raw.apply(lambda col: col.str.upper() == "NULL")).any(axis=1)
+    values = raw.apply(parse_ints)
+    invalid = ~empty & values.isna().any(axis=1)
+    parsed = ~empty & ~invalid
+    known = values["academic_group_id"].isin(group_ids) & \
+        values["teacher_id"].isin(teacher_ids) & \
+        values["subject_id"].isin(subject_ids)
+    exams = values[parsed & known].astype("int64")
+    exams.insert(3, "user_id", user_id)
+    return exams, (np.flatnonzero(invalid) + 1).tolist(), int((parsed & ~known).sum())
+
+
+async def insert_rows(db: AsyncSession, model, rows: pd.DataFrame):
+    """
+    Пакетная вставка строк в таблицу модели. В PostgreSQL (asyncpg) — через COPY,
+    в остальных СУБД (SQLite в тестах) — executemany пачками по BATCH_SIZE.
+    """
+    if rows.empty:
+        return
+    table = model.__table__
+    dialect = db.get_bind().dialect
+    # Значения как объекты Python: драйверы не принимают скаляры NumPy
+    rows = rows.astype(object)
+    if dialect.name == "postgresql" and dialect.driver == "asyncpg":
+        connection = await db.connection()
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            table.name, records=rows.itertuples(index=False, name=None), columns=list(rows.columns))
+        return
+    statement = insert(table)
+    for start in range(0, len(rows), BATCH_SIZE):
+        await db.execute(statement, rows.iloc[start:start + BATCH_SIZE].to_dict("records"))
+
+
+def exams_version(db: Session, exam_model, user_id) -> str:
+    """
+    Версия данных пользователя в БД: хэш числа экзаменов и последнего id
+    """
+    count, last_id = db.execute(
+        select(func.count(exam_model.id), func.max(exam_model.id)).where(exam_model.user_id == user_id)
+    ).one()
+    return hashlib.sha1(f"db:{user_id}:{count}:{last_id}".encode()).hexdigest()[:16]
+
+
+def read_exams(db: Session, exam_model, user_id, fetch_size=FETCH_SIZE) -> pd.DataFrame:
+    """
+    Экзамены пользователя одним потоковым запросом (yield_per) в порядке
+    session_number, exam_number. Строки собираются пачками в массивы NumPy;
+    пропуски (NULL) — NaN.
+    """
+    columns = ["academic_group_id", "session_number", "exam_number", "teacher_id",
+               "subject_id", "all_count", "success_count"]
+    statement = (
+        select(*(getattr(exam_model, col) for col in columns))
+        .where(exam_model.user_id == user_id)
+        .order_by(exam_model.session_number, exam_model.exam_number, exam_model.id)
+        .execution_options(yield_per=fetch_size)
+    )
+    chunks = [np.array(rows, dtype=float) for rows in db.execute(statement).partitions()]
+    values = np.concatenate(chunks) if chunks else np.empty((0, len(columns)))
+    return pd.DataFrame(values, columns=columns)
+
+
+def weighted_norms(db: Session, exam_model, user_id, key: str) -> pd.Series:
+    """
+    Взвешенная норма по `key` (teacher_id или subject_id), посчитанная в БД:
+    доля неуспевших по всем экзаменам преподавателя или предмета
+    """
+    key_column = getattr(exam_model, key)
+    failed = func.sum(exam_model.all_count - exam_model.success_count)
+    statement = (
+        select(key_column, cast(failed, Float) / func.nullif(func.sum(exam_model.all_count), 0))
+        .where(exam_model.user_id == user_id, key_column.is_not(None))
+        .group_by(key_column)
+    )
+    rows = db.execute(statement).all()
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    norms = np.array([row[1] for row in rows], dtype=float)
+    return pd.Series(norms, index=ids)
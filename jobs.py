@@ -0,0 +1,135 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+class QueueFull(Exception):
+    """
+    Очередь задач заполнена
+    """
+
+
+class ResultStore():
+    """
+    Хранилище готовых результатов на диске: один JSON-файл на ключ расчета.
+    Каталог создается при первой записи.
+    """
+    def __init__(self, directory="results"):
+        self.directory = Path(directory)
+
+    def path(self, key) -> Path:
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return self.directory / f"{name}.json"
+
+    def get(self, key):
+        try:
+            with self.path(key).open(encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, value):
+        from columnar import atomic_write
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with atomic_write(self.path(key), encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+
+
+class Job():
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"  # queued -> running -> done | failed
+        self.done = 0
+        self.total = 0
+        self.error = None
+        self.created = time.time()
+
+    def info(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": {"done": self.done, "total": self.total},
+            "error": self.error,
+        }
+
+
+class JobManager():
+    """
+    Фоновые расчеты в ограниченном пуле потоков.
+    Задачи с одинаковым ключом не дублируются, готовые результаты
+    хранятся в ResultStore и при повторном запросе отдаются сразу.
+    """
+    def __init__(self, store: ResultStore, max_workers=1, max_queue=8, max_jobs=1000):
+        self.store = store
+        self.max_queue = max_queue
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._active: dict = {}  # key -> Job, для задач в очереди и в работе
+        self._lock = threading.Lock()
+
+    def submit(self, key, func) -> Job:
+        """
+        Постановка расчета в очередь. `func(job)` — генератор событий прогресса
+        ({"done": .., "total": ..}), возвращающий результат через StopIteration.value.
+        Бросает QueueFull, если в очереди уже max_queue задач.
+        """
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                return job
+            job = Job(key)
+            if self.store.path(key).exists():
+                job.status = "done"
+            else:
+                queued = sum(1 for j in self._active.values() if j.status == "queued")
+                if queued >= self.max_queue:
+                    raise QueueFull()
+                self._active[key] = job
+            self._jobs[job.id] = job
+            self._prune()
+        if job.status == "queued":
+            self._executor.submit(self._run, job, func)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def result(self, job: Job):
+        return self.store.get(job.key)
+
+    def _run(self, job: Job, func):
+        from predict import run_events
+
+        def progress(event):
+            job.done, job.total = event["done"], event["total"]
+
+        job.status = "running"
+        try:
+            result = run_events(func(job), progress)
+            self.store.put(job.key, result)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            with self._lock:
+                self._active.pop(job.key, None)
+
+    def _prune(self):
+        # Старые завершенные задачи забываются (результаты остаются на диске)
+        while len(self._jobs) > self.max_jobs:
+            for job_id, job in self._jobs.items():
+                if job.status in ("done", "failed"):
+                    del self._jobs[job_id]
+                    break
+            else:
+                break
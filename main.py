@@ -1,21 +1,41 @@
-from fastapi import FastAPI, Request, Form, Depends
+import asyncio
+import importlib
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse
 from starlette.middleware.sessions import SessionMiddleware
-from sqlalchemy.orm import Session
 
-from config import templates
-from database import engine, Base, SessionLocal
-from models import User, Group, Teacher, Subject
-from auth import hash_password, verify_password, create_access_token, decode_access_token
+from config import templates, WARMUP
+from auth import authenticate_async
+
+
+# Схема БД создается отдельно: python manage.py create-db
+
+# Модули расчета и графиков, которые роутеры импортируют при первом использовании
+WARMUP_MODULES = ("predict", "charts", "tracing", "ingest")
 
 
-# Base.metadata.drop_all(bind=engine)
+def warm_up():
+    """
+    Предварительный импорт модулей расчета, чтобы первый расчет не ждал их загрузки
+    """
+    for name in WARMUP_MODULES:
+        importlib.import_module(name)
 
-# Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Импорт идет в фоновом потоке: приложение начинает отвечать сразу
+    warmup = asyncio.get_running_loop().run_in_executor(None, warm_up) if WARMUP else None
+    yield
+    if warmup is not None:
+        await warmup
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(SessionMiddleware, secret_key="another-secret-key")
 
 # Статика и шаблоны
@@ -31,36 +51,22 @@ from routers.auth_router import auth_router
 from routers.regiser_router import register_router
 from routers.getdata_router import getdata_router
 from routers.forecast_router import forecast_router
+from routers.jobs_router import jobs_router
 app.include_router(calc_router)
 app.include_router(router_upload)
 app.include_router(auth_router)
 app.include_router(register_router)
 app.include_router(getdata_router)
 app.include_router(forecast_router)
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+app.include_router(jobs_router)
 
 @app.middleware('http')
 async def add_user_to_request(request: Request, call_next):
     request.state.user = None
-    token = request.cookies.get('access_token')
-    db = None
-    try:
-        if token:
-            data = decode_access_token(token)
-            db = SessionLocal()
-            user = db.query(User).get(data.get('user_id'))
-            request.state.user = user
-    except Exception:
-        request.state.user = None
-    finally:
-        if db:
-            db.close()
+    # Статике пользователь не нужен: ни проверки токена, ни обращения к БД
+    if not request.url.path.startswith("/static"):
+        # Промах кэша токенов — запрос в БД вне цикла событий
+        await authenticate_async(request)
     response = await call_next(request)
     return response
 
@@ -96,24 +102,3 @@ async def predict(request: Request):
         {"request": request, "active_page": "forecast"}
         )
 
-
-@app.get('/groups')
-def list_groups(db: Session = Depends(get_db)):
-    items = db.query(Group).all()
-    return [{"id": g.id, "title": g.title} for g in items]
-# аналогично для teachers и subjects
-
-@app.get("/teachers")
-async def list_teachers(db: Session = Depends(get_db)):
-    teachers = db.query(Teacher).all()
-    return [
-        {"id": t.id, "full_name": f"{t.first_name} {t.last_name}"}
-        for t in teachers
-    ]
-@app.get("/subjects")
-async def list_subjects(db: Session = Depends(get_db)):
-    subjects = db.query(Subject).all()
-    return [
-        {"id": s.id, "short_title": s.short_title, "title": s.title}
-        for s in subjects
-    ]
\ No newline at end of file
@@ -0,0 +1,32 @@
+"""
+Управление схемой БД (вместо создания таблиц при импорте database.py).
+
+Запуск:
+    python manage.py create-db   — создать недостающие таблицы (данные не трогаются)
+    python manage.py reset-db    — удалить все таблицы и создать заново (данные теряются)
+"""
+import argparse
+
+from database import Base, engine
+import models  # регистрирует таблицы в Base.metadata
+
+
+def create_db():
+    Base.metadata.create_all(bind=engine)
+
+
+def reset_db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+COMMANDS = {
+    "create-db": create_db,
+    "reset-db": reset_db,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Управление схемой БД")
+    parser.add_argument("command", choices=list(COMMANDS))
+    COMMANDS[parser.parse_args().command]()
@@ -3,9 +3,12 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from database import Base 
 
+# BIGINT-ключ с автоинкрементом; в SQLite автоинкремент есть только у INTEGER PRIMARY KEY
+BigIntegerPK = BigInteger().with_variant(Integer, "sqlite")
+
 class User(Base):
     __tablename__ = "user"
-    id = Column(BigInteger, primary_key=True)
+    id = Column(BigIntegerPK, primary_key=True)
     phone_number = Column(String)
     first_name = Column(String)
     last_name = Column(String)
@@ -39,7 +42,7 @@ class Group(Base):
 
 class Exam(Base):
     __tablename__ = "exam"
-    id = Column(BigInteger, primary_key=True)
+    id = Column(BigIntegerPK, primary_key=True)
     academic_group_id = Column(BigInteger, ForeignKey("group.id"))
     teacher_id = Column(BigInteger, ForeignKey("teacher.id"))
     subject_id = Column(BigInteger, ForeignKey("subject.id"))
@@ -51,4 +54,12 @@ class Exam(Base):
     group = relationship("Group")
     teacher = relationship("Teacher")
     subject = relationship("Subject")
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+
+class ProcessedUpload(Base):
+    # Хэш содержимого последнего импортированного файла пользователя:
+    # повторный /process-uploads того же файла не вставляет данные заново
+    __tablename__ = "processed_upload"
+    user_id = Column(BigInteger, ForeignKey("user.id"), primary_key=True)
+    file = Column(String, primary_key=True)
+    sha1 = Column(String)
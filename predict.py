@@ -1,23 +1,571 @@
-from io import BytesIO
 from scipy import stats
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from columnar import ColumnStore, file_hash
+from tracing import TraceSink
+
+
+class TCriticalTable():
+    """
+    Таблица критических значений t-распределения, общая для всех моделей.
+    Для каждого alpha хранится массив значений по числу степеней свободы;
+    массив лениво достраивается, когда встречается большее число степеней свободы.
+    """
+    def __init__(self):
+        self._tables: dict[float, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def table(self, alpha: float, max_dof: int) -> np.ndarray:
+        """
+        Массив критических значений для dof = 0..max_dof (для dof = 0 — nan)
+        """
+        table = self._tables.get(alpha)
+        if table is None or len(table) <= max_dof:
+            with self._lock:
+                table = self._tables.get(alpha)
+                if table is None or len(table) <= max_dof:
+                    # Растим таблицу с запасом, чтобы не пересчитывать её на каждый новый размер
+                    size = max(max_dof + 1, 2 * len(table) if table is not None else 64)
+                    table = np.empty(size)
+                    table[0] = np.nan
+                    table[1:] = stats.t.ppf(1 - alpha / 2, np.arange(1, size))
+                    table.setflags(write=False)
+                    self._tables[alpha] = table
+        return table
+
+    def lookup(self, alpha: float, dof):
+        """
+        Критическое значение для числа (или массива) степеней свободы
+        """
+        dof = np.asarray(dof, dtype=np.int64)
+        table = self.table(alpha, int(dof.max()) if dof.size else 0)
+        result = table[np.clip(dof, 0, None)]
+        return float(result) if result.ndim == 0 else result
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+
+t_crit_table = TCriticalTable()
+
+
+# Колонки, которые нужны для расчета регрессии, и колонки результата
+FIT_INPUT_COLUMNS = ['session_number', 'examiner_weighted_norm', 'subject_weighted_norm', 'group_performance']
+FIT_OUTPUT_COLUMNS = ['yp', 'error', 'a', 'b', 't_a', 't_b']
+
+# Компактная схема данных DataHandler: идентификаторы — целые с пропусками
+# (Int32, если значения не помещаются — Int64, как BigInteger в models.py),
+# номера и счетчики — узкие целые, доли и нормы — float32
+EXAM_SCHEMA = {
+    'academic_group_id': 'Int32',
+    'teacher_id': 'Int32',
+    'subject_id': 'Int32',
+    'session_number': 'int16',
+    'exam_number': 'int16',
+    'all_count': 'int32',
+    'success_count': 'int32',
+    'students_failed': 'int32',
+    'exam_index': 'int32',
+    'group_performance': 'float32',
+    'examiner_weighted_norm': 'float32',
+    'subject_weighted_norm': 'float32',
+}
+ID_COLUMNS = ['academic_group_id', 'teacher_id', 'subject_id']
+
+
+def apply_schema(frame: pd.DataFrame, categorical_ids=False) -> pd.DataFrame:
+    """
+    Приведение колонок кадра к EXAM_SCHEMA; колонки вне схемы не меняются.
+    Целые колонки с пропусками получают nullable-тип той же ширины,
+    идентификаторы вне диапазона int32 — Int64.
+    При categorical_ids идентификаторы кодируются как category.
+    """
+    int32 = np.iinfo(np.int32)
+    dtypes = {}
+    for col, dtype in EXAM_SCHEMA.items():
+        if col not in frame.columns:
+            continue
+        if dtype.startswith('int') and frame[col].hasnans:
+            dtype = dtype.capitalize()
+        if col in ID_COLUMNS and pd.api.types.is_numeric_dtype(frame[col].dtype) \
+                and (frame[col].min() < int32.min or frame[col].max() > int32.max):
+            dtype = 'Int64'
+        dtypes[col] = dtype
+    if categorical_ids:
+        dtypes.update({col: 'category' for col in ID_COLUMNS if col in frame.columns})
+    return frame.astype(dtypes)
+
+
+def readonly_array(values):
+    """
+    Копия массива колонки, защищенная от записи
+    (numpy, целые с пропусками и category)
+    """
+    if isinstance(values, pd.Categorical):
+        return pd.Categorical.from_codes(readonly_array(values.codes), dtype=values.dtype)
+    if isinstance(values, pd.arrays.IntegerArray):
+        data = readonly_array(values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0))
+        return pd.arrays.IntegerArray(data, readonly_array(np.asarray(values.isna())))
+    values = np.array(values, copy=True)
+    values.flags.writeable = False
+    return values
+
+
+def memory_report(frame: pd.DataFrame) -> dict:
+    """
+    Объем памяти кадра: всего и в байтах на строку, по колонкам
+    """
+    usage = frame.memory_usage(index=False, deep=True)
+    rows = max(len(frame), 1)
+    return {
+        "rows": int(len(frame)),
+        "bytes": int(usage.sum()),
+        "bytes_per_row": float(usage.sum() / rows),
+        "columns": {
+            col: {"dtype": str(frame[col].dtype), "bytes": int(size), "bytes_per_row": float(size / rows)}
+            for col, size in usage.items()
+        },
+    }
+
+
+def significance(a, b, t_a, t_b, dof, alpha):
+    """
+    Проверка значимости коэффициентов: незначимые a и b обнуляются.
+    Критические значения берутся из общей таблицы t_crit_table;
+    для dof = 0 (группа не оценивалась) сравнение не выполняется.
+    """
+    t_crit = t_crit_table.lookup(alpha, dof)
+    with np.errstate(invalid='ignore'):
+        a = np.where(~np.isnan(t_a) & (np.abs(t_a) < t_crit), 0.0, a)
+        b = np.where(~np.isnan(t_b) & (np.abs(t_b) < t_crit), 0.0, b)
+    return a, b
+
+
+def solve_groups(A, B, C, D, E, sizes):
+    """
+    Решение систем 2x2 для массива групп.
+    Возвращает a, b, определитель и маску групп, для которых
+    считаются t-статистики (det != 0 и больше двух экзаменов).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        det = A * D - B * B
+        fitted = (det != 0) & (sizes > 2)
+        a = np.where(fitted, (C * D - B * E) / det, 0.0)
+        b = np.where(fitted, (A * E - B * C) / det, 0.0)
+    return a, b, det, fitted
+
+
+def t_statistics(a, b, A, D, det, rss, sizes, fitted, alpha):
+    """
+    t-статистики коэффициентов по взвешенной сумме квадратов остатков `rss`;
+    незначимые коэффициенты обнуляются. Возвращает a, b, t_a, t_b.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma2 = rss / np.where(fitted, sizes - 2, 1)
+        se_a = np.where(D != 0, np.sqrt(sigma2 * D / det), np.nan)
+        se_b = np.where(A != 0, np.sqrt(sigma2 * A / det), np.nan)
+        t_a = np.where(fitted & (se_a != 0), a / se_a, np.nan)
+        t_b = np.where(fitted & (se_b != 0), b / se_b, np.nan)
+
+    # Обнуляем коэффициенты, если они незначимы
+    a, b = significance(a, b, t_a, t_b, np.where(fitted, sizes - 2, 0), alpha)
+    return a, b, t_a, t_b
+
+
+def fit_arrays(session, examiner_norm, subject_norm, y, starts, decay, alpha):
+    """
+    Расчет регрессии для всех групп над массивами строк.
+    Строки отсортированы по (academic_group_id, exam_index), `starts` — начала групп.
+    Суммы A..E считаются через np.add.reduceat, системы 2x2 и t-тесты
+    решаются массивами, результат раскладывается обратно по строкам
+    в порядке FIT_OUTPUT_COLUMNS.
+    """
+    sizes = np.diff(np.append(starts, len(y)))
+
+    max_session = np.fmax.reduceat(session, starts)
+    w = decay ** (np.repeat(max_session, sizes) - session)
+
+    S = subject_norm
+    T = examiner_norm * S
+
+    def group_sum(values):
+        # Как и pandas-сумма в calculate_group, пропуски не учитываются
+        return np.add.reduceat(np.where(np.isnan(values), 0.0, values), starts)
+
+    A = group_sum(w * T * T)
+    B = group_sum(w * S * T)
+    C = group_sum(w * y * T)
+    D = group_sum(w * S * S)
+    E = group_sum(w * y * S)
+
+    a, b, det, fitted = solve_groups(A, B, C, D, E, sizes)
+
+    with np.errstate(invalid='ignore'):
+        resid = y - (np.repeat(a, sizes) * T + np.repeat(b, sizes) * S)
+    rss = group_sum(w * resid ** 2)
+    a, b, t_a, t_b = t_statistics(a, b, A, D, det, rss, sizes, fitted, alpha)
+
+    yp = np.repeat(a, sizes) * T + np.repeat(b, sizes) * S
+    error = np.where(np.repeat(fitted, sizes), np.abs(y - yp), np.abs(y))
+
+    return (np.clip(yp, 0, 1), error,
+            np.repeat(a, sizes), np.repeat(b, sizes),
+            np.repeat(t_a, sizes), np.repeat(t_b, sizes))
+
+
+_executors: dict[int, ProcessPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Общий пул процессов для параллельного расчета (по одному на число воркеров)
+    """
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            # spawn: fork из многопоточного сервера небезопасен
+            executor = ProcessPoolExecutor(max_workers=workers,
+                                           mp_context=multiprocessing.get_context('spawn'))
+            _executors[workers] = executor
+        return executor
+
+
+def _fit_chunk(in_name, out_name, n, lo, hi, starts, decay, alpha):
+    """
+    Расчет части групп в процессе пула: строки [lo, hi) читаются из общей памяти
+    и результат пишется туда же, сами данные между процессами не копируются.
+    """
+    shm_in = shared_memory.SharedMemory(name=in_name)
+    shm_out = shared_memory.SharedMemory(name=out_name)
+    columns = out = None
+    try:
+        columns = np.ndarray((len(FIT_INPUT_COLUMNS), n), dtype=float, buffer=shm_in.buf)
+        out = np.ndarray((len(FIT_OUTPUT_COLUMNS), n), dtype=float, buffer=shm_out.buf)
+        fitted = fit_arrays(*columns[:, lo:hi], starts - lo, decay, alpha)
+        for i, values in enumerate(fitted):
+            out[i, lo:hi] = values
+    finally:
+        # Представления должны быть освобождены до close()
+        columns = out = None
+        shm_in.close()
+        shm_out.close()
+
+
+def fit_parallel(columns: np.ndarray, starts: np.ndarray, decay, alpha, workers: int):
+    """
+    Параллельный вариант fit_arrays: группы делятся на непрерывные части
+    примерно равного числа строк и считаются в пуле процессов.
+    Результат совпадает с последовательным расчетом.
+    """
+    n = columns.shape[1]
+    # Несколько частей на воркер, чтобы сгладить разброс размеров групп
+    n_chunks = min(len(starts), workers * 4)
+    bounds = np.unique(np.searchsorted(starts, np.linspace(0, n, n_chunks + 1)[:-1]))
+    # Граница внутри последней группы дает len(starts) — такой части нет
+    bounds = bounds[bounds < len(starts)]
+    chunk_starts = np.append(starts[bounds], n)
+    group_bounds = np.append(bounds, len(starts))
+
+    shm_in = shared_memory.SharedMemory(create=True, size=max(columns.nbytes, 1))
+    shm_out = shared_memory.SharedMemory(create=True, size=max(len(FIT_OUTPUT_COLUMNS) * n * 8, 1))
+    try:
+        np.ndarray(columns.shape, dtype=float, buffer=shm_in.buf)[:] = columns
+        executor = get_executor(workers)
+        futures = [
+            executor.submit(_fit_chunk, shm_in.name, shm_out.name, n,
+                            int(chunk_starts[i]), int(chunk_starts[i + 1]),
+                            starts[group_bounds[i]:group_bounds[i + 1]], decay, alpha)
+            for i in range(len(bounds))
+        ]
+        for future in futures:
+            future.result()
+        out = np.ndarray((len(FIT_OUTPUT_COLUMNS), n), dtype=float, buffer=shm_out.buf)
+        result = tuple(out[i].copy() for i in range(len(FIT_OUTPUT_COLUMNS)))
+        del out
+        return result
+    finally:
+        shm_in.close()
+        shm_in.unlink()
+        shm_out.close()
+        shm_out.unlink()
+
+
+class IncrementalFit():
+    """
+    Состояние расчета для повторных проходов с удалением выбросов.
+    Для каждой группы хранятся взвешенные суммы; при удалении строк из них
+    вычитается вклад удаленных строк и пересчитываются только затронутые группы.
+    """
+    # Суммы нормальных уравнений (A..E) и суммы для остатков по строкам,
+    # где определены y, T и S: rss = F - 2aC - 2bE + a²A + 2abB + b²D
+    SUMS = ['A', 'B', 'C', 'D', 'E', 'rA', 'rB', 'rC', 'rD', 'rE', 'rF']
+
+    def __init__(self, results: pd.DataFrame, decay, alpha, min_size=8):
+        """
+        `results` — результат Model.calculate_all (отсортирован по группе и exam_index)
+        """
+        self.frame = results.reset_index(drop=True)
+        self.alpha = alpha
+        self.min_size = min_size
+
+        starts = Model.group_starts(self.frame)
+        sizes = np.diff(np.append(starts, len(self.frame)))
+        self.code = np.repeat(np.arange(len(starts)), sizes)
+        self.count = sizes.copy()
+        self.alive = np.ones(len(self.frame), dtype=bool)
+
+        session = self.frame['session_number'].to_numpy(dtype=float, na_value=np.nan)
+        # Вес считается от последней сессии исходной группы: при удалении
+        # строк все веса группы умножаются на одну константу, что не меняет a, b и t
+        max_session = np.fmax.reduceat(session, starts) if len(starts) else session
+        self.w = decay ** (max_session[self.code] - session)
+        self.S = self.frame['subject_weighted_norm'].to_numpy(dtype=float)
+        self.T = self.frame['examiner_weighted_norm'].to_numpy(dtype=float) * self.S
+        self.y = self.frame['group_performance'].to_numpy(dtype=float)
+
+        self.sums = np.add.reduceat(self._contributions(slice(None)), starts, axis=1) \
+            if len(starts) else np.zeros((len(self.SUMS), 0))
+
+        # Коэффициенты групп и прогнозы строк из полного расчета
+        self.a = self.frame['a'].to_numpy(dtype=float)[starts]
+        self.b = self.frame['b'].to_numpy(dtype=float)[starts]
+        self.t_a = self.frame['t_a'].to_numpy(dtype=float)[starts]
+        self.t_b = self.frame['t_b'].to_numpy(dtype=float)[starts]
+        self.yp = self.frame['yp'].to_numpy(dtype=float).copy()
+        self.error = self.frame['error'].to_numpy(dtype=float).copy()
+
+    def _contributions(self, rows) -> np.ndarray:
+        """
+        Вклад строк в суммы SUMS (пропуски не учитываются)
+        """
+        w, T, S, y = self.w[rows], self.T[rows], self.S[rows], self.y[rows]
+        full = ~(np.isnan(T) | np.isnan(S) | np.isnan(y))
+        terms = [w * T * T, w * S * T, w * y * T, w * S * S, w * y * S]
+        terms += [np.where(full, v, 0.0) for v in terms]
+        terms.append(np.where(full, w * y * y, 0.0))
+        contrib = np.vstack(terms)
+        return np.where(np.isnan(contrib), 0.0, contrib)
+
+    def remove(self, rows: np.ndarray):
+        """
+        Удаление строк (позиций в self.frame) и пересчет затронутых групп
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[self.alive[rows]]
+        if not len(rows):
+            return
+        self.alive[rows] = False
+        codes = self.code[rows]
+        n_groups = len(self.count)
+        self.count -= np.bincount(codes, minlength=n_groups)
+        contrib = self._contributions(rows)
+        for k in range(len(self.SUMS)):
+            self.sums[k] -= np.bincount(codes, weights=contrib[k], minlength=n_groups)
+
+        groups = np.unique(codes)
+        groups = groups[self.count[groups] >= self.min_size]
+        self._refit(groups)
+
+    def _refit(self, groups: np.ndarray):
+        A, B, C, D, E, rA, rB, rC, rD, rE, rF = self.sums[:, groups]
+        sizes = self.count[groups]
+        a, b, det, fitted = solve_groups(A, B, C, D, E, sizes)
+        rss = rF - 2 * a * rC - 2 * b * rE + a * a * rA + 2 * a * b * rB + b * b * rD
+        # Отрицательные значения возможны только из-за ошибок округления
+        rss = np.maximum(rss, 0.0)
+        a, b, t_a, t_b = t_statistics(a, b, A, D, det, rss, sizes, fitted, self.alpha)
+        self.a[groups], self.b[groups] = a, b
+        self.t_a[groups], self.t_b[groups] = t_a, t_b
+
+        # Прогнозы пересчитываются только для строк затронутых групп
+        affected = np.zeros(len(self.count), dtype=bool)
+        affected[groups] = True
+        is_fitted = np.zeros(len(self.count), dtype=bool)
+        is_fitted[groups] = fitted
+        rows = np.flatnonzero(affected[self.code] & self.alive)
+        codes = self.code[rows]
+        yp = self.a[codes] * self.T[rows] + self.b[codes] * self.S[rows]
+        y = self.y[rows]
+        self.yp[rows] = np.clip(yp, 0, 1)
+        self.error[rows] = np.where(is_fitted[codes], np.abs(y - yp), np.abs(y))
+
+    def kept(self) -> np.ndarray:
+        """
+        Позиции строк, входящих в результат (живые строки групп с ≥ min_size экзаменами)
+        """
+        return np.flatnonzero(self.alive & (self.count >= self.min_size)[self.code])
+
+    def errors(self) -> pd.DataFrame:
+        """
+        Ошибки строк результата для поиска выбросов; индекс — позиции в self.frame
+        """
+        rows = self.kept()
+        return pd.DataFrame({
+            'academic_group_id': self.frame['academic_group_id'].to_numpy()[rows],
+            'error': self.error[rows],
+        }, index=rows)
+
+    def results(self) -> pd.DataFrame:
+        """
+        Текущий результат в формате Model.calculate_all
+        """
+        rows = self.kept()
+        codes = self.code[rows]
+        df = self.frame.iloc[rows].reset_index(drop=True)
+        df['yp'] = self.yp[rows]
+        df['error'] = self.error[rows]
+        df['a'] = self.a[codes]
+        df['b'] = self.b[codes]
+        df['t_a'] = self.t_a[codes]
+        df['t_b'] = self.t_b[codes]
+        return df
+
+    def removed_exam_indices(self) -> np.ndarray:
+        return self.frame['exam_index'].to_numpy()[~self.alive]
+
+
+# Колонки взвешенных норм по ключам
+NORM_COLUMNS = {'teacher_id': 'examiner_weighted_norm', 'subject_id': 'subject_weighted_norm'}
+
+
+class NormTable():
+    """
+    Таблица взвешенных норм преподавателей или предметов: id по возрастанию
+    и нормы в тех же позициях. Одиночный поиск — через словарь (get),
+    поиск массива id — через индекс (lookup), нормы строк — выборкой по кодам (gather).
+    """
+    def __init__(self, ids, norms):
+        self.ids = pd.Index(np.asarray(ids, dtype=np.int64))
+        # Точность как у колонок норм (EXAM_SCHEMA): прогнозы не зависят от того,
+        # построена таблица при подготовке данных или по сохраненным колонкам
+        self.norms = readonly_array(np.asarray(norms, dtype=EXAM_SCHEMA['examiner_weighted_norm']))
+        self._by_id: dict = dict(zip(self.ids.tolist(), self.norms.tolist()))
+
+    @classmethod
+    def aggregate(cls, keys: np.ndarray, students_failed: np.ndarray, all_count: np.ndarray):
+        """
+        Нормы по экзаменам: доля неуспевших по всем экзаменам каждого id
+        (пропуски в счетчиках не учитываются, строки без id — тоже).
+        Возвращает таблицу и коды строк (позиция id в таблице, -1 — пропуск).
+        """
+        codes, ids = pd.factorize(keys, sort=True)
+        rows = codes >= 0
+        failed = np.bincount(codes[rows], weights=np.nan_to_num(students_failed[rows]), minlength=len(ids))
+        total = np.bincount(codes[rows], weights=np.nan_to_num(all_count[rows]), minlength=len(ids))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return cls(ids, failed / total), codes
+
+    @classmethod
+    def from_rows(cls, keys: np.ndarray, row_norms: np.ndarray) -> "NormTable":
+        """
+        Таблица по уже посчитанным нормам строк (первое вхождение каждого id)
+        """
+        codes, ids = pd.factorize(keys, sort=True)
+        found, first = np.unique(codes, return_index=True)
+        return cls(ids, row_norms[first[found >= 0]])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, id_, default=None):
+        return self._by_id.get(id_, default)
+
+    def gather(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Нормы строк по кодам из aggregate; для кода -1 — NaN
+        """
+        # Код -1 попадает на добавленный в конец NaN
+        return np.append(self.norms, np.nan)[codes]
+
+    def lookup(self, ids) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Нормы для массива id: маска найденных и нормы (NaN для ненайденных)
+        """
+        pos = self.ids.get_indexer(ids)
+        return pos >= 0, self.gather(pos)
+
+
 class DataHandler():
     """
     Класс хранения, обработки и визуализации данных
     """
-    def __init__(self, path="uploads/exam.csv"):
-        # Чтение данных
-        g = pd.read_csv(path)
-        self._groups = g.copy()
-        
+    # Версия формата подготовленных данных в колоночном хранилище;
+    # меняется при изменении подготовки данных в _prepare
+    PREPARED_FORMAT = 2
+
+    def __init__(self, path="uploads/exam.csv", version=None, columnar=True, categorical_ids=False):
+        # Версия данных — хэш содержимого файла (для ключей кэшей, зависящих от содержимого)
+        self.version = version if version is not None else file_hash(path)
+        # Таблицы норм по ключам NORM_COLUMNS (см. norm_table)
+        self._norm_tables: dict[str, NormTable] = {}
+        # Подготовленные данные берутся из колоночного хранилища рядом с файлом
+        # (отображаются в память без разбора CSV); при отсутствии — готовятся и сохраняются
+        store = ColumnStore.for_file(path) if columnar else None
+        tag = f"{self.version}-v{self.PREPARED_FORMAT}"
+        groups = store.load(tag) if store is not None else None
+        if groups is not None:
+            self._groups = groups
+        else:
+            self._groups = apply_schema(pd.read_csv(path))
+            self._prepare()
+            self._freeze()
+            if store is not None:
+                store.save(tag, self._groups)
+        if categorical_ids:
+            # Кодирование идентификаторов не сохраняется в хранилище
+            self._groups = apply_schema(self._groups, categorical_ids=True)
+            self._freeze()
+
+        self._init_indexes()
+
+    def _init_indexes(self):
+        # Индексы прогнозов по параметрам модели (строятся лениво)
+        self._forecast_indexes: dict[tuple, "ForecastIndex"] = {}
+        self._forecast_lock = threading.Lock()
+
+    @classmethod
+    def from_db(cls, db, user_id, categorical_ids=False) -> "DataHandler":
+        """
+        Данные пользователя из таблицы Exam вместо uploads/exam.csv.
+        Экзамены читаются одним потоковым запросом уже в порядке
+        session_number, exam_number, взвешенные нормы считаются в БД (GROUP BY).
+        """
+        from ingest import exams_version, read_exams, weighted_norms
+        from models import Exam
+
+        handler = cls.__new__(cls)
+        handler.version = exams_version(db, Exam, user_id)
+        handler._norm_tables = {}
+        groups = apply_schema(read_exams(db, Exam, user_id))
+        groups["students_failed"] = groups["all_count"] - groups["success_count"]
+        groups["group_performance"] = groups["students_failed"] / groups["all_count"]
+        groups["exam_index"] = np.arange(1, len(groups) + 1)
+        for key, name in NORM_COLUMNS.items():
+            norms = weighted_norms(db, Exam, user_id, key)
+            table = handler._norm_tables[key] = NormTable(norms.index, norms.to_numpy())
+            groups[name] = table.lookup(groups[key].to_numpy(dtype=float, na_value=np.nan))[1]
+        handler._groups = apply_schema(groups, categorical_ids=categorical_ids)
+        handler._freeze()
+        handler._init_indexes()
+        return handler
+
+    def _prepare(self):
+        """
+        Подготовка исходных данных: доля неуспевших, порядок экзаменов и взвешенные нормы
+        """
         # Количество неуспевших: разница между общим количеством и количеством успешных
         self._groups["students_failed"] = self._groups["all_count"] - self._groups["success_count"]
         # Доля неуспевших
         self._groups["group_performance"] = self._groups["students_failed"] / self._groups["all_count"]
-        
+
         # Сортировка и добавление exam_index
         self._groups = self._groups.sort_values(by=["session_number", "exam_number"]).reset_index(drop=True)
         self._groups["exam_index"] = np.arange(1, len(self._groups) + 1)
@@ -25,7 +573,9 @@ class DataHandler():
         # Расчет взвешенных норм
         self.calc_ex_weigh_norm()
         self.calc_sub_weighted_norm()
-        
+
+        self._groups = apply_schema(self._groups)
+
     def get_data_statistics(self) -> dict:
         stats = {
             "num_rows": int(self._groups.shape[0]),
@@ -37,7 +587,7 @@ class DataHandler():
                 "dtype": str(self._groups[col].dtype),
                 "num_missing": int(self._groups[col].isna().sum()),
             }            
-            if self._groups[col].dtype in ["int64", "float64"]:
+            if pd.api.types.is_numeric_dtype(self._groups[col].dtype):
                 col_info.update({
                     "mean": float(self._groups[col].mean()),
                     "std": float(self._groups[col].std()),
@@ -50,48 +600,152 @@ class DataHandler():
                 mode = self._groups[col].mode()
                 col_info["most_common"] = str(mode[0]) if not mode.empty else None            
             stats["column_info"][col] = col_info        
+        stats["memory"] = self.memory_report()
         return stats
     
+    def forecast_index(self, decay=0.9, alpha=0.1) -> "ForecastIndex":
+        """
+        Индекс прогнозов для параметров модели. Данные обработчика не меняются,
+        поэтому индекс строится один раз и живет вместе с обработчиком.
+        """
+        key = (decay, alpha)
+        index = self._forecast_indexes.get(key)
+        if index is None:
+            with self._forecast_lock:
+                index = self._forecast_indexes.get(key)
+                if index is None:
+                    index = ForecastIndex(self._groups, decay, alpha,
+                                          norms=(self.examiner_norms, self.subject_norms))
+                    self._forecast_indexes[key] = index
+        return index
+
+    def memory_usage(self) -> int:
+        """
+        Объем памяти данных обработчика в байтах
+        """
+        return int(self._groups.memory_usage(deep=True).sum())
+
+    def memory_report(self) -> dict:
+        """
+        Объем памяти данных по колонкам и в байтах на строку (см. memory_report)
+        """
+        return memory_report(self._groups)
+
+    def _freeze(self):
+        """
+        Делает данные неизменяемыми: каждая колонка хранится отдельным
+        массивом только для чтения, поэтому кадр можно отдавать без копирования
+        """
+        columns = {col: readonly_array(self._groups[col].array) for col in self._groups.columns}
+        self._groups = pd.DataFrame(columns, copy=False)
+
     @property
     def groups(self):
+        """
+        Кадр данных без копирования: колонки общие с обработчиком и доступны
+        только для чтения (запись значений вызывает ValueError, добавление
+        и замена колонок в полученном кадре допустимы). Для изменения данных — snapshot().
+        """
+        return self._groups.copy(deep=False)
+
+    def snapshot(self) -> pd.DataFrame:
+        """
+        Независимая изменяемая копия данных
+        """
         return self._groups.copy()
 
+    def column(self, name: str) -> np.ndarray:
+        """
+        Колонка данных как массив только для чтения (без копирования)
+        """
+        return self._groups[name].to_numpy()
+
+    def norm_table(self, key: str) -> NormTable:
+        """
+        Таблица взвешенных норм по teacher_id или subject_id. После подготовки
+        данных берется готовой, для данных из колоночного хранилища строится
+        по колонкам норм при первом обращении.
+        """
+        table = self._norm_tables.get(key)
+        if table is None:
+            table = NormTable.from_rows(self._groups[key].to_numpy(dtype=float, na_value=np.nan),
+                                        self._groups[NORM_COLUMNS[key]].to_numpy(dtype=float))
+            self._norm_tables[key] = table
+        return table
+
+    @property
+    def examiner_norms(self) -> NormTable:
+        return self.norm_table('teacher_id')
+
+    @property
+    def subject_norms(self) -> NormTable:
+        return self.norm_table('subject_id')
+
+    def _weighted_norm(self, key: str):
+        """
+        Таблица норм по `key` и колонка норм строк: нормы считаются по кодам
+        id (pd.factorize + np.bincount) и переносятся в строки одной выборкой, без merge
+        """
+        keys, failed, total = (self._groups[col].to_numpy(dtype=float, na_value=np.nan)
+                               for col in (key, 'students_failed', 'all_count'))
+        table, codes = NormTable.aggregate(keys, failed, total)
+        self._norm_tables[key] = table
+        self._groups[NORM_COLUMNS[key]] = table.gather(codes)
+
     def calc_ex_weigh_norm(self):
         """
         Расчет взвешенной нормы для экзаменаторов и добавление её в self._groups
         """
-        grouped_examiners = self._groups.groupby("teacher_id").agg({
-            'students_failed': 'sum',
-            'all_count': 'sum'
-        }).reset_index()
-        grouped_examiners['examiner_weighted_norm'] = grouped_examiners['students_failed'] / grouped_examiners['all_count']
-        self._groups = pd.merge(self._groups,
-                                grouped_examiners[["teacher_id", "examiner_weighted_norm"]],
-                                on="teacher_id",
-                                how="left")
+        self._weighted_norm('teacher_id')
 
     def calc_sub_weighted_norm(self):
         """
         Расчет взвешенной нормы для предметов и добавление её в self._groups
         """
-        grouped_subject = self._groups.groupby("subject_id").agg({
-            'students_failed': 'sum',
-            'all_count': 'sum'
-        }).reset_index()
-        grouped_subject['subject_weighted_norm'] = grouped_subject['students_failed'] / grouped_subject['all_count']
-        self._groups = pd.merge(self._groups,
-                                grouped_subject[["subject_id", 'subject_weighted_norm']],
-                                on="subject_id",
-                                how="left")
+        self._weighted_norm('subject_id')
+
+
+class Events():
+    """
+    Итератор по событиям генератора, сохраняющий его результат
+    (значение return) в self.value после исчерпания
+    """
+    def __init__(self, events):
+        self.events = events
+        self.value = None
+
+    def __iter__(self):
+        self.value = yield from self.events
+
+
+def run_events(events, on_event=None):
+    """
+    Прогон генератора событий до конца; каждое событие передается в on_event.
+    Возвращает результат генератора.
+    """
+    stream = Events(events)
+    for event in stream:
+        if on_event is not None:
+            on_event(event)
+    return stream.value
+
 
 class Model():
     """
     Класс реализация модели прогноза
     """
-    def __init__(self, data_handler, decay=0.9, alpha=0.05):   
+    def __init__(self, data_handler, decay=0.9, alpha=0.05, workers=1,
+                 trace: TraceSink | None = None, target_groups=()):
         self.data = data_handler.groups  # Данные всех групп
+        # Таблицы норм преподавателей и предметов для прогнозов
+        self.norms = (data_handler.examiner_norms, data_handler.subject_norms)
         self.decay = decay
         self.alpha = alpha
+        # Число процессов для расчета групп; 1 — последовательный расчет
+        self.workers = workers
+        # Отладочная трассировка строк выбранных групп
+        self.trace = trace if trace is not None else TraceSink()
+        self.target_groups = list(target_groups)
         self.all = 0
         self.neadekv = 0
 
@@ -134,7 +788,7 @@ class Model():
             if se_b and se_b != 0:
                 t_b = b / se_b
 
-            t_crit = stats.t.ppf(1 - self.alpha / 2, len(df) - 2)
+            t_crit = t_crit_table.lookup(self.alpha, len(df) - 2)
 
             # Обнуляем коэффициенты, если они незначимы
             if not np.isnan(t_a) and abs(t_a) < t_crit:
@@ -165,78 +819,108 @@ class Model():
 
         return df
     
-    def calculate_all(self, target_groups=None):
+    def fit_groups(self, df: pd.DataFrame, starts: np.ndarray) -> pd.DataFrame:
         """
-        Расчет регрессии отдельно для каждой группы.
-        Сохраняет данные в файл `debug_groups.txt` только для групп с ≥8 экзаменами.
+        Пакетный расчет регрессии сразу для всех групп.
+        `df` должен быть отсортирован по (academic_group_id, exam_index),
+        `starts` — позиции первых строк каждой группы.
+        При workers > 1 группы делятся на части и считаются в пуле процессов.
         """
-        if target_groups is None:
-            target_groups = [301601, -145860, 143649]
-        debug_file = 'debug_groups.txt'
-
-        # Очистка файла перед началом
-        if os.path.exists(debug_file):
-            os.remove(debug_file)
-
-        results = []
-        for group_id, group_data in self.data.groupby("academic_group_id"):
-            df = self.calculate_group(group_data)
+        columns = np.vstack([df[col].to_numpy(dtype=float, na_value=np.nan) for col in FIT_INPUT_COLUMNS])
+        if self.workers > 1 and len(starts) >= 2 * self.workers:
+            try:
+                fitted = fit_parallel(columns, starts, self.decay, self.alpha, self.workers)
+            except (OSError, BrokenProcessPool) as e:
+                print(f"Параллельный расчет недоступен ({e}), считаем последовательно")
+                fitted = fit_arrays(*columns, starts, self.decay, self.alpha)
+        else:
+            fitted = fit_arrays(*columns, starts, self.decay, self.alpha)
 
-            # Исключаем группы с менее чем 8 экзаменами после обработки
-            if len(df) < 8:
-                print(f"Группа {group_id}: (len {len(df)}  < 8)")
-                continue
+        df = df.copy()
+        for col, values in zip(FIT_OUTPUT_COLUMNS, fitted):
+            df[col] = values
+        return df
 
-            results.append(df)
+    @staticmethod
+    def group_starts(df: pd.DataFrame) -> np.ndarray:
+        """
+        Позиции начала групп в кадре, отсортированном по academic_group_id
+        """
+        gid = df['academic_group_id'].to_numpy(dtype=np.int64)
+        return np.flatnonzero(np.r_[True, gid[1:] != gid[:-1]]) if len(gid) else np.array([], dtype=int)
 
-            # Логирование удалённых экзаменов
-            num_exams_before = len(group_data)
-            num_exams_after = len(df)
-            removed_count = num_exams_before - num_exams_after
+    def calculate_all(self, target_groups=None):
+        """
+        Расчет регрессии отдельно для каждой группы (пакетно, см. fit_groups).
+        В результат попадают только группы с ≥8 экзаменами.
+        Строки групп `target_groups` (по умолчанию self.target_groups) передаются в self.trace.
+        """
+        data = self.data[self.data['academic_group_id'].notna()]
+        data = data.sort_values(['academic_group_id', 'exam_index'], kind='mergesort').reset_index(drop=True)
+        starts = self.group_starts(data)
+        if len(starts) == 0:
+            return data.assign(yp=[], error=[], a=[], b=[], t_a=[], t_b=[])
+        df = self.fit_groups(data, starts)
 
-            # Сохранение данных для целевых групп
-            if group_id in target_groups:
-                df_debug = df.copy()
-                df_debug['group_id'] = group_id
-                df_debug.to_csv(debug_file, mode='a', sep='\t',
-                                header=not os.path.exists(debug_file), index=False)
+        # Исключаем группы с менее чем 8 экзаменами
+        sizes = np.diff(np.append(starts, len(df)))
+        small = sizes < 8
+        if small.any():
+            print(f"Пропущено групп с менее чем 8 экзаменами: {int(small.sum())}")
+        results = df[np.repeat(~small, sizes)].reset_index(drop=True)
 
-        return pd.concat(results, ignore_index=True)
+        self._trace('fit', results, target_groups)
+        return results
 
-    def detect_outliers(self, results: pd.DataFrame, percentile: float = 0.9):
+    def _trace(self, stage: str, results: pd.DataFrame, target_groups=None):
         """
-        Выявление 10% экзаменов с наибольшими ошибками внутри каждой группы
+        Передача строк целевых групп в приемник трассировки
         """
-        to_remove = []
-        for group_id, group_df in results.groupby("academic_group_id"):
-            threshold = group_df["error"].quantile(percentile)
-            outliers = group_df[group_df["error"] >= threshold].index.tolist()
-            to_remove.extend(outliers)
-        return to_remove
-    
-    def recalculate_with_outliers_removed(self, results: pd.DataFrame):
+        if target_groups is None:
+            target_groups = self.target_groups
+        if not self.trace.enabled or not len(target_groups):
+            return
+        self.trace.write(stage, results[results['academic_group_id'].isin(target_groups)])
+
+    def detect_outliers(self, results: pd.DataFrame, percentile: float = 0.9) -> pd.Series:
         """
-        Удаление 10% худших экзаменов и пересчет модели
+        Выявление 10% экзаменов с наибольшими ошибками внутри каждой группы.
+        Возвращает булеву маску по строкам `results` (True — выброс).
         """
-        target_groups = [301601, -145860, 143649]  # Целевые группы
-        debug_file = "debug_groups.txt"
+        threshold = results.groupby("academic_group_id", observed=True)["error"].transform("quantile", percentile)
+        return results["error"] >= threshold
 
-        # Удаление выбросов
-        outliers = self.detect_outliers(results)
-        filtered_data = self.data.drop(index=outliers).reset_index(drop=True)
-        self.data = filtered_data
+    def recalculate_with_outliers_removed(self, results: pd.DataFrame, passes: int = 1,
+                                          percentile: float = 0.9):
+        """
+        Удаление 10% худших экзаменов и пересчет модели, `passes` раз подряд.
+        `percentile` — одно значение для всех проходов или список по проходам.
+        Полный расчет не повторяется: из сумм групп вычитается вклад
+        удаленных экзаменов (см. IncrementalFit).
+        """
+        return run_events(self.iter_outlier_passes(results, passes, percentile))
 
-        # Пересчёт модели после удаления
-        final_results = self.calculate_all(target_groups=target_groups)
+    def iter_outlier_passes(self, results: pd.DataFrame, passes: int = 1,
+                            percentile: float = 0.9):
+        """
+        Генератор для recalculate_with_outliers_removed: после каждого прохода
+        отдает его номер, итоговый результат возвращается через StopIteration.value
+        """
+        state = IncrementalFit(results, self.decay, self.alpha)
+        percentiles = [percentile] * passes if np.ndim(percentile) == 0 else list(percentile)
+        for i, q in enumerate(percentiles, start=1):
+            # Удаление выбросов
+            errors = state.errors()
+            outliers = self.detect_outliers(errors, q)
+            state.remove(errors.index[outliers.to_numpy()])
+            yield i
 
-        # Сохранение в debug_groups.txt ПОСЛЕ удаления выбросов и пересчёта
-        for group_id, group_df in final_results.groupby("academic_group_id"):
-            if group_id in target_groups:
-                df_debug = group_df.copy()
-                df_debug['group_id'] = group_id
-                df_debug.to_csv(debug_file, mode='a', sep='\t',
-                                header=not os.path.exists(debug_file), index=False)
+        removed = state.removed_exam_indices()
+        self.data = self.data[~self.data['exam_index'].isin(removed)].reset_index(drop=True)
+        final_results = state.results()
 
+        # Трассировка ПОСЛЕ удаления выбросов и пересчёта
+        self._trace('outliers_removed', final_results)
         return final_results
 
     def forecast(self, group_id: int, teacher_id: int, subject_id: int, exam_index: int):
@@ -253,9 +937,105 @@ class Model():
         df_hist = self.calculate_group(hist)
         a = df_hist['a'].iloc[-1]
         b = df_hist['b'].iloc[-1]
-        norm_t = self.data.loc[self.data['teacher_id'] == teacher_id, 'examiner_weighted_norm'].iloc[0]
-        norm_s = self.data.loc[self.data['subject_id'] == subject_id, 'subject_weighted_norm'].iloc[0]
+        examiner_norms, subject_norms = self.norms
+        norm_t = examiner_norms.get(teacher_id)
+        norm_s = subject_norms.get(subject_id)
+        if norm_t is None or norm_s is None:
+            raise ValueError("Не найдены нормы для указанного преподавателя или предмета")
 
         T = norm_t * norm_s
         S = norm_s
-        return float(np.clip(a * T + b * S, 0, 1))
\ No newline at end of file
+        return float(np.clip(a * T + b * S, 0, 1))
+
+
+class ForecastIndex():
+    """
+    Индекс для прогнозов без повторного расчета: число экзаменов каждой группы,
+    коэффициенты (a, b), полученные на всей истории, и нормы преподавателей и предметов
+    (таблицы NormTable; если norms не переданы, строятся по колонкам норм data).
+    """
+    def __init__(self, data: pd.DataFrame, decay=0.9, alpha=0.1, norms=None):
+        data = data[data['academic_group_id'].notna()]
+        history = data.sort_values(['academic_group_id', 'exam_index'],
+                                   kind='mergesort').reset_index(drop=True)
+        starts = Model.group_starts(history)
+        sizes = np.diff(np.append(starts, len(history)))
+
+        # Столбцы по группам для пакетных прогнозов
+        self.group_ids = pd.Index(history['academic_group_id'].to_numpy(dtype=np.int64)[starts])
+        self.group_count = sizes
+        self.group_a = np.zeros(len(starts))
+        self.group_b = np.zeros(len(starts))
+        if len(starts):
+            columns = [history[col].to_numpy(dtype=float, na_value=np.nan) for col in FIT_INPUT_COLUMNS]
+            _, _, a, b, _, _ = fit_arrays(*columns, starts, decay, alpha)
+            self.group_a, self.group_b = a[starts], b[starts]
+
+        # group_id -> (число экзаменов, a, b) для одиночных прогнозов
+        self.groups: dict[int, tuple] = dict(zip(
+            self.group_ids.tolist(),
+            zip(sizes.tolist(), self.group_a.tolist(), self.group_b.tolist())))
+
+        if norms is None:
+            norms = tuple(NormTable.from_rows(data[key].to_numpy(dtype=float, na_value=np.nan),
+                                              data[name].to_numpy(dtype=float))
+                          for key, name in NORM_COLUMNS.items())
+        self.examiner_norms, self.subject_norms = norms
+
+    def forecast(self, group_id: int, teacher_id: int, subject_id: int, exam_index: int) -> float:
+        """
+        Прогноз доли неуспевающих для будущего экзамена группы
+        """
+        group = self.groups.get(group_id)
+        count = group[0] if group is not None else 0
+        if count < 3:
+            raise ValueError("Недостаточно предыдущих экзаменов для прогноза")
+        if exam_index <= count:
+            raise ValueError(f"Этот экзамен уже есть (текущих: {count}). Введите номер > {count}")
+
+        norm_t = self.examiner_norms.get(teacher_id)
+        norm_s = self.subject_norms.get(subject_id)
+        if norm_t is None or norm_s is None:
+            raise ValueError("Не найдены нормы для указанного преподавателя или предмета")
+
+        _, a, b = group
+        y_p = a * norm_t * norm_s + b * norm_s
+        return float(max(0.0, min(1.0, y_p)))
+
+    def forecast_many(self, group_ids, teacher_ids, subject_ids, exam_indices) -> pd.DataFrame:
+        """
+        Пакетный прогноз для набора (group_id, teacher_id, subject_id, exam_index).
+        Нормы и коэффициенты ищутся массивами; ошибка отдельной строки
+        записывается в колонку `error` (forecast = NaN) и не прерывает весь пакет.
+        """
+        batch = pd.DataFrame({
+            'group_id': np.asarray(group_ids, dtype=np.int64),
+            'teacher_id': np.asarray(teacher_ids, dtype=np.int64),
+            'subject_id': np.asarray(subject_ids, dtype=np.int64),
+            'exam_index': np.asarray(exam_indices, dtype=np.int64),
+        })
+
+        def lookup(index, values, column, missing):
+            pos = index.get_indexer(batch[column].to_numpy())
+            found = pos >= 0
+            result = np.full(len(batch), missing, dtype=values.dtype)
+            result[found] = values[pos[found]]
+            return found, result
+
+        has_group, count = lookup(self.group_ids, self.group_count, 'group_id', 0)
+        _, a = lookup(self.group_ids, self.group_a, 'group_id', np.nan)
+        _, b = lookup(self.group_ids, self.group_b, 'group_id', np.nan)
+        has_teacher, norm_t = self.examiner_norms.lookup(batch['teacher_id'].to_numpy())
+        has_subject, norm_s = self.subject_norms.lookup(batch['subject_id'].to_numpy())
+
+        # Как и в forecast: сначала размер истории, затем номер экзамена, затем нормы
+        error = np.full(len(batch), None, dtype=object)
+        error[~(has_teacher & has_subject)] = "Не найдены нормы для указанного преподавателя или предмета"
+        exists = batch['exam_index'].to_numpy() <= count
+        error[exists] = [f"Этот экзамен уже есть (текущих: {c}). Введите номер > {c}" for c in count[exists]]
+        error[count < 3] = "Недостаточно предыдущих экзаменов для прогноза"
+
+        y_p = np.fmax(0.0, np.fmin(1.0, a * norm_t * norm_s + b * norm_s))
+        batch['forecast'] = np.where(pd.isna(error), y_p, np.nan)
+        batch['error'] = pd.Series(error, dtype=object)
+        return batch
@@ -2,20 +2,13 @@ from fastapi import APIRouter, Request, Form, Depends
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import get_db
 from models import User
-from auth import hash_password, verify_password, create_access_token
+from auth import hash_password, verify_password, create_access_token, invalidate_token
 
 auth_router = APIRouter()
 templates = Jinja2Templates(directory="frontend/templates")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @auth_router.get("/login")
 def login_get(request: Request):
     flash = request.session.pop("flash", [])
@@ -43,6 +36,7 @@ def login_post(
 
 @auth_router.get("/logout")
 def logout(request: Request):
+    invalidate_token(request.cookies.get("access_token"))
     response = RedirectResponse(url="/", status_code=303)
     response.delete_cookie("access_token")
     request.session.setdefault("flash", []).append(("success", "Вы вышли из системы."))
@@ -1,95 +1,246 @@
-import uuid
-from fastapi import APIRouter, Depends, Request, BackgroundTasks
-from fastapi.responses import JSONResponse
-from io import BytesIO
-
-import matplotlib
-matplotlib.use('Agg')  # безголовый бэкенд
-import matplotlib.pyplot as plt
-
-import base64
-import numpy as np
-from scipy.interpolate import make_interp_spline
+import json
+from typing import TYPE_CHECKING
+
+from fastapi import APIRouter, Depends, Request, BackgroundTasks, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from starlette.concurrency import run_in_threadpool
 
+from config import (FIT_WORKERS, TRACE_FILE, CHART_CACHE_MAX_BYTES, CHART_WORKERS,
+                    RESULT_CACHE_ITEMS, RESULT_CACHE_MAX_BYTES, RESULT_SPILL_DIR, MAX_OUTLIER_PASSES)
 from schemas import Group as GroupSchema
-from predict import DataHandler, Model
+from cache import LRUCache, ResultMemo, handler_cache, exam_handler
+
+# pandas, numpy, scipy и matplotlib импортируются при первом расчете или графике,
+# а не при запуске приложения (см. warm_up в main.py)
+if TYPE_CHECKING:
+    import pandas as pd
+    from predict import DataHandler
+    from tracing import TraceSink
 
 calc_router = APIRouter()
-handlers: dict[str, DataHandler] = {}
 
+# Параметры модели для /calculate_all
+DECAY = 0.9
+ALPHA = 0.1
+PERCENTILE = 0.9
+OUTLIER_PASSES = 2
+MODEL_PARAMS = (DECAY, ALPHA, PERCENTILE, OUTLIER_PASSES)
 
-async def get_data_handler(request: Request) -> DataHandler:
-    session_id = request.session.get('session_id')
-    if not session_id:
-        session_id = str(uuid.uuid4())
-        request.session['session_id'] = session_id
-    if session_id not in handlers:
-        handlers[session_id] = DataHandler()
-    return handlers[session_id]
+# Итоговые результаты расчета по (версия данных, параметры модели)
+result_memo = ResultMemo(max_items=RESULT_CACHE_ITEMS, max_bytes=RESULT_CACHE_MAX_BYTES,
+                         spill_dir=RESULT_SPILL_DIR or None)
+# PNG-графики групп по (версия данных, группа, параметры модели)
+chart_cache = LRUCache(max_bytes=CHART_CACHE_MAX_BYTES, sizeof=len)
 
-# Internal sync function for heavy computation
-def _calculate(handler: DataHandler) -> list[GroupSchema]:
-    model = Model(handler, decay=0.9, alpha=0.1)
+
+def make_trace_sink() -> "TraceSink":
+    from tracing import TraceSink, FileTraceSink
+
+    return FileTraceSink(TRACE_FILE) if TRACE_FILE else TraceSink()
+
+
+def _compute_events(handler: "DataHandler", trace_groups: list[int] = (), params=MODEL_PARAMS):
+    """
+    Расчет модели с удалением выбросов по этапам: после каждого этапа отдается
+    событие прогресса, итоговый результат возвращается через StopIteration.value.
+    params — (decay, alpha, percentile, число проходов).
+    """
+    from predict import Events, Model
+
+    decay, alpha, percentile, passes = params
+    total = 1 + passes
+    trace = make_trace_sink()
+    model = Model(handler, decay=decay, alpha=alpha, workers=FIT_WORKERS,
+                  trace=trace, target_groups=trace_groups)
     df = model.calculate_all()
-    df1 = model.recalculate_with_outliers_removed(df)
-    df2 = model.recalculate_with_outliers_removed(df1)
-
-    result: list[GroupSchema] = []
-    for gid, group_df in df2.groupby('academic_group_id'):
-        # compute error and parameters
-        error = group_df['error'].abs().mean()
-        row = group_df.iloc[0]
-        t_a, a, b = row['t_a'], row['a'], row['b']
-        exam_nums = np.arange(1, len(group_df) + 1)
-        # plot
-        fig, ax = plt.subplots(figsize=(6,4))
-        try:
-            x_smooth = np.linspace(exam_nums.min(), exam_nums.max(), 300)
-            spl_act = make_interp_spline(exam_nums, group_df['group_performance'], k=3)
-            spl_pred = make_interp_spline(exam_nums, group_df['yp'], k=3)
-            ax.plot(x_smooth, spl_act(x_smooth), label='Реальные')
-            ax.plot(x_smooth, spl_pred(x_smooth), label='Предсказанные')
-        except ValueError:
-            ax.plot(exam_nums, group_df['group_performance'], marker='o', label='Реальные', color="green")
-            ax.plot(exam_nums, group_df['yp'], marker='o', label='Предсказанные')
-        ax.set_xlabel('Экзамены')
-        ax.set_ylabel('Успеваемость')
-        ax.set_title(f'Группа {gid}')
-        ax.legend()
-        buf = BytesIO()
-        plt.savefig(buf, format='png')
-        plt.close(fig)
-        buf.seek(0)
-        img_b64 = base64.b64encode(buf.read()).decode()
-        result.append(GroupSchema(
+    yield {"type": "progress", "stage": "fit", "done": 1, "total": total}
+    passes_iter = Events(model.iter_outlier_passes(df, passes=passes, percentile=percentile))
+    for done in passes_iter:
+        yield {"type": "progress", "stage": "outliers", "done": 1 + done, "total": total}
+    trace.flush()
+    return passes_iter.value
+
+
+def _fit_events(handler: "DataHandler", trace_groups: list[int] = (), params=MODEL_PARAMS):
+    """
+    _compute_events с мемоизацией: готовый результат для тех же данных
+    и параметров отдается сразу, одновременные одинаковые запросы ждут один расчет.
+    Если трассировка включена (TRACE_FILE), расчет с trace_groups выполняется заново.
+    """
+    if trace_groups and make_trace_sink().enabled:
+        return (yield from _compute_events(handler, trace_groups, params))
+    total = 1 + params[-1]
+    cached = {"type": "progress", "stage": "cached", "done": total, "total": total}
+    return (yield from result_memo.compute_events(
+        (handler.version, *params), lambda: _compute_events(handler, params=params), cached))
+
+
+def _fit(handler: "DataHandler", trace_groups: list[int] = (), params=MODEL_PARAMS) -> "pd.DataFrame":
+    """
+    Результат расчета модели с удалением выбросов (см. _fit_events)
+    """
+    from predict import run_events
+
+    return run_events(_fit_events(handler, trace_groups, params))
+
+
+def _iter_groups(df2: "pd.DataFrame", version, params=MODEL_PARAMS):
+    """
+    Результаты групп (поля GroupSchema) по одной, в порядке id группы
+    """
+    from predict import Model
+
+    query = f"?v={version}"
+    if params != MODEL_PARAMS:
+        query += "&decay={}&alpha={}&percentile={}&passes={}".format(*params)
+    # Строки результата отсортированы по группам
+    starts = Model.group_starts(df2)
+    error = df2['error'].abs().groupby(df2['academic_group_id'], sort=True, observed=True).mean()
+    first = df2.iloc[starts]
+    for gid, err, t_a, a, b in zip(
+            first['academic_group_id'].tolist(), error.tolist(),
+            first['t_a'].tolist(), first['a'].tolist(), first['b'].tolist()):
+        yield GroupSchema(
             id=int(gid),
-            error=str(error),
+            error=str(err),
             t_a=str(t_a),
             a=str(a),
             b=str(b),
-            img=img_b64,
-        ))
-    return result
+            img=f"/charts/{int(gid)}{query}",
+        )
 
-def _forecast(handler: DataHandler, group_id, teacher_id, subject_id, exam_index):
-    model = Model(handler, decay=0.9, alpha=0.1)
-    df = model.calculate_all()
-    df1 = model.recalculate_with_outliers_removed(df)
-    predict = model.forecast(group_id, teacher_id, subject_id, exam_index)
-    return predict
 
-    
+# Internal sync function for heavy computation
+def _calculate(handler: "DataHandler", trace_groups: list[int] = ()) -> list[GroupSchema]:
+    return list(_iter_groups(_fit(handler, trace_groups), handler.version))
+
+
+def _calculate_stream(handler: "DataHandler", trace_groups: list[int] = (), batch_size=500):
+    """
+    NDJSON-поток /calculate_all: события прогресса по этапам, затем группы
+    пачками по batch_size строк и итоговое событие done
+    """
+    from predict import Events
+
+    events = Events(_fit_events(handler, trace_groups))
+    for event in events:
+        yield json.dumps(event) + "\n"
+    df2 = events.value
+
+    lines = []
+    count = 0
+    for group in _iter_groups(df2, handler.version):
+        lines.append(json.dumps({"type": "group", **group.model_dump()}, ensure_ascii=False))
+        count += 1
+        if len(lines) >= batch_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+    yield json.dumps({"type": "done", "groups": count}) + "\n"
+
+
+def _export_charts(handler: "DataHandler") -> bytes:
+    """
+    ZIP-архив графиков всех групп. Уже нарисованные берутся из кэша,
+    остальные рисуются в пуле процессов (CHART_WORKERS) и тоже кэшируются.
+    """
+    import numpy as np
+    from charts import pack_series, render_all, charts_archive
+
+    df2 = _fit(handler)
+    group_ids, offsets, actual, predicted = pack_series(df2)
+    keys = [(handler.version, gid, *MODEL_PARAMS) for gid in group_ids.tolist()]
+    pngs = [chart_cache.get(key) for key in keys]
+
+    missing = np.array([i for i, png in enumerate(pngs) if png is None], dtype=int)
+    if len(missing):
+        # Упаковываем ряды только недостающих групп
+        rows = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in missing])
+        sizes = offsets[missing + 1] - offsets[missing]
+        rendered = render_all(group_ids[missing], np.append(0, np.cumsum(sizes)),
+                              actual[rows], predicted[rows], workers=CHART_WORKERS)
+        for i, png in zip(missing.tolist(), rendered):
+            pngs[i] = png
+            chart_cache.put(keys[i], png)
+    return charts_archive(group_ids, pngs)
+
+
+def _group_chart(handler: "DataHandler", group_id: int, params=MODEL_PARAMS) -> bytes | None:
+    """
+    PNG-график группы из кэша; при промахе рисуется по сохраненным результатам
+    """
+    key = (handler.version, group_id, *params)
+    png = chart_cache.get(key)
+    if png is not None:
+        return png
+    import numpy as np
+    from charts import render_group_chart
+
+    df2 = _fit(handler, params=params)
+    ids = df2['academic_group_id'].to_numpy(dtype=np.int64)
+    lo, hi = np.searchsorted(ids, group_id, 'left'), np.searchsorted(ids, group_id, 'right')
+    if lo == hi:
+        return None
+    group_df = df2.iloc[lo:hi]
+    png = render_group_chart(group_id, group_df['group_performance'], group_df['yp'])
+    chart_cache.put(key, png)
+    return png
+
 @calc_router.get('/calculate_all')  # remove response_model to avoid Pydantic error
 async def calculate_all(
     background_tasks: BackgroundTasks,
-    handler: DataHandler = Depends(get_data_handler)
+    trace_group: list[int] = Query(default=[]),
+    stream: bool = False,
+    handler: "DataHandler" = Depends(exam_handler)
 ):
+    if stream:
+        # Синхронный генератор Starlette перебирает в пуле потоков
+        return StreamingResponse(_calculate_stream(handler, trace_group),
+                                 media_type="application/x-ndjson")
     # Run computation in threadpool to avoid blocking
-    groups = await run_in_threadpool(_calculate, handler)
+    groups = await run_in_threadpool(_calculate, handler, trace_group)
     return groups
 
+@calc_router.get('/export/charts.zip')
+async def export_charts(handler: "DataHandler" = Depends(exam_handler)):
+    archive = await run_in_threadpool(_export_charts, handler)
+    return Response(
+        content=archive,
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="charts.zip"'},
+    )
+
+@calc_router.get('/charts/{group_id}')
+async def group_chart(
+    request: Request,
+    group_id: int,
+    decay: float = Query(DECAY, gt=0, lt=1),
+    alpha: float = Query(ALPHA, gt=0, lt=1),
+    percentile: float = Query(PERCENTILE, gt=0, lt=1),
+    passes: int = Query(OUTLIER_PASSES, ge=0, le=MAX_OUTLIER_PASSES),
+    handler: "DataHandler" = Depends(exam_handler)
+):
+    # График определяется версией данных, группой и параметрами модели
+    params = (decay, alpha, percentile, passes)
+    etag = f'"{handler.version}-{group_id}-{decay}-{alpha}-{percentile}-{passes}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=3600"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    png = await run_in_threadpool(_group_chart, handler, group_id, params)
+    if png is None:
+        return JSONResponse(status_code=404, content={"detail": "Группа не найдена"})
+    return Response(content=png, media_type="image/png", headers=headers)
+
 @calc_router.get('/get_data_stats')
-async def get_data_stats(handler: DataHandler = Depends(get_data_handler)):
+async def get_data_stats(handler: "DataHandler" = Depends(exam_handler)):
     stats = await run_in_threadpool(handler.get_data_statistics)
     return JSONResponse(content=stats)
+
+@calc_router.get('/cache_stats')
+async def cache_stats():
+    return {
+        "handlers": handler_cache.stats(),
+        "results": result_memo.cache.stats(),
+        "charts": chart_cache.stats(),
+    }
@@ -1,54 +1,87 @@
 # routers/getdata_router.py
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from database import SessionLocal
+import hashlib
+import json
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import REFERENCE_PAGE_SIZE, REFERENCE_PAGE_MAX
+from database import get_async_db
 from models import Group, Teacher, Subject, User
-from auth import decode_access_token
-from fastapi import Request, HTTPException
-from jose import ExpiredSignatureError
+from auth import get_current_user
+from cache import reference_cache, reference_generation
 
 getdata_router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(request: Request, db: Session = Depends(get_db)):
-    token = request.cookies.get("access_token")
-    if not token:
-        raise HTTPException(401, "Не авторизован")
-    try:
-        data = decode_access_token(token)
-    except ExpiredSignatureError:
-        raise HTTPException(401, "Сессия истекла")
-    except Exception:
-        raise HTTPException(401, "Неверный токен")
-    user = db.get(User, data["user_id"])
-    if not user:
-        raise HTTPException(401, "Пользователь не найден")
-    return user
+
+async def _reference_page(request: Request, db: AsyncSession, user: User, model, columns,
+                          render, after: int | None, limit: int) -> Response:
+    """
+    Страница справочника пользователя: только нужные колонки, по возрастанию id,
+    начиная после курсора `after` (keyset-пагинация). Готовые страницы кэшируются
+    по пользователю; курсор следующей страницы — в заголовке X-Next-After,
+    неизменившаяся страница отдается как 304 по If-None-Match.
+    """
+    key = (user.id, reference_generation(user.id), model.__tablename__, after, limit)
+    page = reference_cache.get(key)
+    if page is None:
+        statement = select(*columns).where(model.user_id == user.id)
+        if after is not None:
+            statement = statement.where(model.id > after)
+        # Лишняя строка показывает, что есть следующая страница
+        rows = (await db.execute(statement.order_by(model.id).limit(limit + 1))).all()
+        next_after = rows[limit - 1].id if len(rows) > limit else None
+        body = json.dumps([render(row) for row in rows[:limit]], ensure_ascii=False).encode()
+        page = (body, f'"{hashlib.sha1(body).hexdigest()[:16]}"', next_after)
+        reference_cache.put(key, page)
+
+    body, etag, next_after = page
+    # no-cache: браузер хранит ответ, но каждый раз сверяет ETag
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if next_after is not None:
+        headers["X-Next-After"] = str(next_after)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 @getdata_router.get("/groups")
-def list_groups(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    return [
-        {"id": g.id, "title": g.title}
-        for g in db.query(Group).filter(Group.user_id == user.id).all()
-    ]
+async def list_groups(
+    request: Request,
+    after: int | None = None,
+    limit: int = Query(REFERENCE_PAGE_SIZE, ge=1, le=REFERENCE_PAGE_MAX),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+):
+    return await _reference_page(
+        request, db, user, Group, (Group.id, Group.title),
+        lambda g: {"id": g.id, "title": g.title}, after, limit)
 
 @getdata_router.get("/teachers")
-def list_teachers(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    return [
-        {"id": t.id, "full_name": f"{t.last_name} {t.first_name} {t.patronymic}"}
-        for t in db.query(Teacher).filter(Teacher.user_id == user.id).all()
-    ]
+async def list_teachers(
+    request: Request,
+    after: int | None = None,
+    limit: int = Query(REFERENCE_PAGE_SIZE, ge=1, le=REFERENCE_PAGE_MAX),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+):
+    return await _reference_page(
+        request, db, user, Teacher,
+        (Teacher.id, Teacher.last_name, Teacher.first_name, Teacher.patronymic),
+        lambda t: {"id": t.id, "full_name": f"{t.last_name} {t.first_name} {t.patronymic}"},
+        after, limit)
 
 @getdata_router.get("/subjects")
-def list_subjects(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    return [
-        {"id": s.id, "short_title": s.short_title}
-        for s in db.query(Subject).filter(Subject.user_id == user.id).all()
-    ]
+async def list_subjects(
+    request: Request,
+    after: int | None = None,
+    limit: int = Query(REFERENCE_PAGE_SIZE, ge=1, le=REFERENCE_PAGE_MAX),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+):
+    return await _reference_page(
+        request, db, user, Subject, (Subject.id, Subject.short_title),
+        lambda s: {"id": s.id, "short_title": s.short_title}, after, limit)
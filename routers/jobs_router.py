@@ -0,0 +1,64 @@
+# routers/jobs_router.py
+
+from typing import TYPE_CHECKING
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+
+from config import JOB_WORKERS, JOB_QUEUE_LIMIT, RESULTS_DIR
+from jobs import JobManager, ResultStore, QueueFull
+from cache import exam_handler
+from schemas import JobRequest
+from routers.calc_router import _fit_events, _iter_groups
+
+if TYPE_CHECKING:
+    from predict import DataHandler
+
+jobs_router = APIRouter()
+
+job_manager = JobManager(ResultStore(RESULTS_DIR), max_workers=JOB_WORKERS, max_queue=JOB_QUEUE_LIMIT)
+
+
+def _job_func(handler: "DataHandler", params):
+    """
+    Расчет для задачи: события прогресса модели, результат — список групп
+    """
+    def run(job):
+        df2 = yield from _fit_events(handler, params=params)
+        return [group.model_dump() for group in _iter_groups(df2, handler.version, params)]
+    return run
+
+
+@jobs_router.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest, handler: "DataHandler" = Depends(exam_handler)):
+    """
+    Постановка расчета в очередь. Если результат для этих данных и параметров
+    уже посчитан, задача сразу получает статус done.
+    """
+    if request.version is not None and request.version != handler.version:
+        return JSONResponse(status_code=409, content={"detail": "Данные изменились", "version": handler.version})
+    params = (request.decay, request.alpha, request.percentile, request.passes)
+    try:
+        job = job_manager.submit((handler.version, *params), _job_func(handler, params))
+    except QueueFull:
+        return JSONResponse(status_code=429, content={"detail": "Очередь расчетов заполнена, повторите позже"},
+                            headers={"Retry-After": "5"})
+    return job.info()
+
+
+@jobs_router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"detail": "Задача не найдена"})
+    return job.info()
+
+
+@jobs_router.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"detail": "Задача не найдена"})
+    if job.status != "done":
+        return JSONResponse(status_code=409, content=job.info())
+    return job_manager.result(job)
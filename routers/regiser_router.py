@@ -2,20 +2,13 @@ from fastapi import APIRouter, Request, Form, Depends
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import get_db
 from models import User
 from auth import hash_password
 
 register_router = APIRouter()
 templates = Jinja2Templates(directory="frontend/templates")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @register_router.get("/register")
 def register_get(request: Request):
     flash = request.session.pop("flash", [])
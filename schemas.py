@@ -1,5 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Annotated, Optional
+
+from config import MAX_OUTLIER_PASSES
 
 
 class Group(BaseModel):
@@ -13,3 +15,36 @@ class Group(BaseModel):
     class Config:
         orm_mode = True
 
+
+# Идентификаторы прогноза обрабатываются как int64; выход за диапазон — ошибка 422
+Int64 = Annotated[int, Field(ge=-2**63, le=2**63 - 1)]
+
+
+class ForecastItem(BaseModel):
+    group_id: Int64
+    teacher_id: Int64
+    subject_id: Int64
+    exam_index: Int64
+
+
+class ForecastBatch(BaseModel):
+    """
+    Пакет прогнозов: список кортежей `items` и/или колонки одинаковой длины
+    """
+    items: list[ForecastItem] = []
+    group_id: list[Int64] = []
+    teacher_id: list[Int64] = []
+    subject_id: list[Int64] = []
+    exam_index: list[Int64] = []
+
+
+class JobRequest(BaseModel):
+    """
+    Параметры фонового расчета; version — ожидаемая версия данных (необязательно).
+    Границы параметров — как у /charts/{group_id}.
+    """
+    version: Optional[str] = None
+    decay: float = Field(0.9, gt=0, lt=1)
+    alpha: float = Field(0.1, gt=0, lt=1)
+    percentile: float = Field(0.9, gt=0, lt=1)
+    passes: int = Field(2, ge=0, le=MAX_OUTLIER_PASSES)
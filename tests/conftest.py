@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Модули приложения лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Тестовая БД — SQLite во временном каталоге (database.py читает URL при импорте)
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db"))
+
+
+def write_exams(path, group_ids, teacher_ids, subject_ids, size=10, seed=0):
+    """
+    exam.csv: по `size` экзаменов на каждую группу (size — число или список по группам)
+    """
+    rng = np.random.default_rng(seed)
+    sizes = np.broadcast_to(size, len(group_ids))
+    n = int(sizes.sum())
+    all_count = rng.integers(10, 30, n)
+    pd.DataFrame({
+        "academic_group_id": np.repeat(group_ids, sizes),
+        "session_number": np.concatenate([np.sort(rng.integers(1, 9, s)) for s in sizes]),
+        "exam_number": rng.integers(1, 6, n),
+        "teacher_id": np.resize(teacher_ids, n),
+        "subject_id": np.resize(subject_ids, n),
+        "success_count": (all_count * rng.random(n)).astype(int),
+        "all_count": all_count,
+    }).to_csv(path, index=False)
+
+
+@pytest.fixture
+def exam_csv(tmp_path):
+    """
+    Фабрика exam.csv во временном каталоге (аргументы — как у write_exams)
+    """
+    def make(*args, **kwargs):
+        path = tmp_path / "exam.csv"
+        write_exams(path, *args, **kwargs)
+        return path
+    return make
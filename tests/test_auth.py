@@ -0,0 +1,49 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Приложение читает шаблоны и статику из frontend/ текущего каталога
+    os.symlink(os.path.join(ROOT, "frontend"), tmp_path / "frontend")
+    monkeypatch.chdir(tmp_path)
+    import database
+    import models
+    import main
+    from auth import create_access_token, token_cache
+
+    database.Base.metadata.create_all(database.engine)
+    with database.SessionLocal() as db:
+        db.execute(delete(models.ProcessedUpload))
+        db.execute(delete(models.Exam))
+        db.execute(delete(models.User))
+        db.add(models.User(id=1, first_name="Иван"))
+        db.commit()
+    token_cache.clear()
+    token_cache.hits = token_cache.misses = 0
+
+    client = TestClient(main.app)
+    client.cookies.set("access_token", create_access_token(1))
+    return client
+
+
+def test_token_is_looked_up_once_per_request(client):
+    from auth import token_cache
+
+    for _ in range(3):
+        assert client.get("/info").status_code == 200
+    stats = token_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["items"]) == (2, 1, 1)
+
+
+def test_logout_removes_token(client):
+    from auth import token_cache
+
+    client.get("/info")
+    client.get("/logout", follow_redirects=False)
+    assert token_cache.stats()["items"] == 0
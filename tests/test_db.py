@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete
+
+from predict import DataHandler
+
+
+def test_from_db_matches_csv(tmp_path):
+    import database
+    import models
+
+    # Пары (session_number, exam_number) уникальны: порядок строк однозначен в обоих путях
+    rng = np.random.default_rng(0)
+    n = 40
+    order = rng.permutation(n)
+    all_count = rng.integers(10, 30, n)
+    exams = pd.DataFrame({
+        "academic_group_id": rng.choice([1, 2, 3], n),
+        "session_number": order // 5 + 1,
+        "exam_number": order % 5 + 1,
+        "teacher_id": rng.choice([1, 2, 3, 4], n),
+        "subject_id": rng.choice([1, 2], n),
+        "success_count": (all_count * rng.random(n)).astype(int),
+        "all_count": all_count,
+    })
+    path = tmp_path / "exam.csv"
+    exams.to_csv(path, index=False)
+
+    database.Base.metadata.create_all(database.engine)
+    with database.SessionLocal() as db:
+        for model in (models.ProcessedUpload, models.Exam, models.Group, models.Teacher,
+                      models.Subject, models.User):
+            db.execute(delete(model))
+        db.add(models.User(id=1))
+        db.add_all([models.Group(id=i, user_id=1) for i in (1, 2, 3)])
+        db.add_all([models.Teacher(id=i, user_id=1) for i in (1, 2, 3, 4)])
+        db.add_all([models.Subject(id=i, user_id=1) for i in (1, 2)])
+        db.flush()
+        db.add_all([models.Exam(user_id=1, **row) for row in exams.to_dict("records")])
+        db.commit()
+
+        from_db = DataHandler.from_db(db, 1).groups
+
+    from_csv = DataHandler(path, columnar=False).groups
+    pd.testing.assert_frame_equal(from_db, from_csv, check_like=True)
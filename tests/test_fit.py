@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from predict import fit_arrays, fit_parallel
+
+
+def fit_columns(sizes, seed=0):
+    """
+    Входные колонки fit_arrays (session, нормы, y) для групп размеров `sizes`
+    и начала групп
+    """
+    rng = np.random.default_rng(seed)
+    n = int(np.sum(sizes))
+    columns = np.vstack([
+        np.concatenate([np.sort(rng.integers(1, 9, size)) for size in sizes]).astype(float),
+        rng.uniform(0.05, 0.5, n),
+        rng.uniform(0.05, 0.5, n),
+        rng.uniform(0.0, 1.0, n),
+    ])
+    starts = np.append(0, np.cumsum(sizes)[:-1])
+    return columns, starts
+
+
+@pytest.mark.parametrize("sizes", [
+    [1, 1, 1, 97],             # последняя группа больше n / (4 * workers)
+    [200] + [3] * 20,          # большая первая группа
+    [5] * 30 + [400] + [2] * 5,
+])
+def test_fit_parallel_matches_serial(sizes):
+    columns, starts = fit_columns(sizes)
+    serial = fit_arrays(*columns, starts, 0.9, 0.1)
+    parallel = fit_parallel(columns, starts, 0.9, 0.1, workers=2)
+    for expected, actual in zip(serial, parallel):
+        np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=1e-12)
@@ -0,0 +1,29 @@
+import numpy as np
+
+from predict import DataHandler, IncrementalFit, Model, FIT_OUTPUT_COLUMNS
+
+
+def test_incremental_refit_matches_full_refit(exam_csv):
+    path = exam_csv(list(range(40)), list(range(1, 30)), list(range(1, 20)),
+                    size=np.resize([8, 9, 12, 20], 40))
+    model = Model(DataHandler(path, columnar=False), decay=0.9, alpha=0.1)
+    results = model.calculate_all()
+
+    state = IncrementalFit(results, model.decay, model.alpha)
+    rng = np.random.default_rng(1)
+    for _ in range(2):
+        state.remove(rng.choice(len(results), len(results) // 10, replace=False))
+    incremental = state.results()
+
+    # Полный расчет на оставшихся строках; группы меньше 8 экзаменов отбрасываются
+    kept = results.drop(index=np.flatnonzero(~state.alive)).reset_index(drop=True)
+    starts = Model.group_starts(kept)
+    full = model.fit_groups(kept.drop(columns=FIT_OUTPUT_COLUMNS), starts)
+    sizes = np.diff(np.append(starts, len(full)))
+    full = full[np.repeat(sizes >= 8, sizes)].reset_index(drop=True)
+
+    assert incremental['exam_index'].tolist() == full['exam_index'].tolist()
+    assert len(full) < len(results)
+    for col in FIT_OUTPUT_COLUMNS:
+        np.testing.assert_allclose(incremental[col].to_numpy(dtype=float), full[col].to_numpy(dtype=float),
+                                   rtol=1e-6, atol=1e-9, err_msg=col)
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from cache import ResultMemo
+from predict import run_events
+
+
+def test_concurrent_streams_share_one_computation():
+    memo = ResultMemo()
+    calls = []
+
+    def events():
+        calls.append(1)
+        time.sleep(0.2)
+        yield {"done": 1, "total": 1}
+        return pd.DataFrame({"x": [1, 2]})
+
+    results, seen = [], []
+
+    def stream():
+        results.append(run_events(memo.compute_events("key", events, cached={"cached": True}), seen.append))
+
+    threads = [threading.Thread(target=stream) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert [df["x"].tolist() for df in results] == [[1, 2]] * 4
+    # Владелец расчета отдает события прогресса, остальные — событие cached
+    assert seen.count({"done": 1, "total": 1}) == 1 and seen.count({"cached": True}) == 3
+
+
+def test_failed_computation_is_retried():
+    memo = ResultMemo()
+
+    def failing():
+        raise ValueError("fail")
+        yield
+
+    def events():
+        return pd.DataFrame({"x": [3]})
+        yield
+
+    with pytest.raises(ValueError):
+        run_events(memo.compute_events("key", failing))
+    assert run_events(memo.compute_events("key", events))["x"].tolist() == [3]
+
+
+def test_evicted_results_are_removed_from_disk(tmp_path):
+    memo = ResultMemo(max_items=1, spill_dir=tmp_path)
+    memo.put("a", pd.DataFrame({"x": [1.0]}))
+    memo.put("b", pd.DataFrame({"x": [2.0]}))
+    assert [entry.name for entry in tmp_path.iterdir()] == [memo._name("b")]
+    assert memo.get("a") is None
+
+
+def test_trace_groups_use_memo_when_tracing_is_off(exam_csv, monkeypatch):
+    from predict import DataHandler
+    from routers import calc_router
+
+    monkeypatch.setattr(calc_router, "TRACE_FILE", "")
+    monkeypatch.setattr(calc_router, "result_memo", ResultMemo())
+    handler = DataHandler(exam_csv([1, 2], [1, 2], [1, 2], size=12), columnar=False)
+    first = calc_router._fit(handler, trace_groups=[1])
+    assert calc_router._fit(handler, trace_groups=[1]) is first
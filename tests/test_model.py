@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from predict import DataHandler, Model, FIT_INPUT_COLUMNS, FIT_OUTPUT_COLUMNS, fit_arrays
+
+
+def fit_frame(seed=0):
+    """
+    Экзамены групп, покрывающие особые случаи расчета: обычные группы,
+    пропуски норм, группы из 1-2 экзаменов и группы с нулевым определителем
+    """
+    rng = np.random.default_rng(seed)
+    groups = []
+    for gid, size in enumerate([12, 9, 1, 2, 3, 10, 10, 8]):
+        groups.append(pd.DataFrame({
+            'academic_group_id': gid,
+            'exam_index': np.arange(size),
+            'session_number': np.sort(rng.integers(1, 9, size)).astype(float),
+            'examiner_weighted_norm': rng.uniform(0.05, 0.5, size),
+            'subject_weighted_norm': rng.uniform(0.05, 0.5, size),
+            'group_performance': rng.uniform(0.0, 1.0, size),
+        }))
+    df = pd.concat(groups, ignore_index=True)
+    group = df['academic_group_id']
+    # Пропуски норм
+    df.loc[[1, 5], 'examiner_weighted_norm'] = np.nan
+    df.loc[15, 'subject_weighted_norm'] = np.nan
+    # T = 0.5 * S: A * D == B * B точно, определитель равен нулю
+    df.loc[group == 5, 'examiner_weighted_norm'] = 0.5
+    df.loc[group == 5, 'subject_weighted_norm'] = 1.0
+    # Нулевые нормы предмета: A = B = D = 0
+    df.loc[group == 6, 'subject_weighted_norm'] = 0.0
+    return df
+
+
+@pytest.fixture
+def model(exam_csv):
+    return Model(DataHandler(exam_csv([1], [1], [1]), columnar=False), decay=0.9, alpha=0.1)
+
+
+def test_fit_arrays_matches_calculate_group(model):
+    df = fit_frame()
+    starts = Model.group_starts(df)
+    columns = [df[col].to_numpy(dtype=float) for col in FIT_INPUT_COLUMNS]
+    fitted = fit_arrays(*columns, starts, model.decay, model.alpha)
+
+    expected = pd.concat([model.calculate_group(group) for _, group in df.groupby('academic_group_id')],
+                         ignore_index=True)
+    for col, values in zip(FIT_OUTPUT_COLUMNS, fitted):
+        np.testing.assert_allclose(values, expected[col].to_numpy(dtype=float),
+                                   rtol=1e-9, atol=1e-12, err_msg=col)
+
+
+def test_calculate_all_matches_calculate_group(exam_csv):
+    path = exam_csv([3, 1, 2, 4], [1, 2, 3], [5, 6], size=[12, 8, 20, 9])
+    model = Model(DataHandler(path, columnar=False), decay=0.9, alpha=0.1)
+    results = model.calculate_all()
+    # calculate_group считает по колонкам float32, fit_arrays — во float64
+    for gid, group in results.groupby('academic_group_id'):
+        expected = model.calculate_group(group.drop(columns=FIT_OUTPUT_COLUMNS))
+        for col in FIT_OUTPUT_COLUMNS:
+            np.testing.assert_allclose(group[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float),
+                                       rtol=1e-5, atol=1e-6, err_msg=f"{gid}: {col}")
@@ -0,0 +1,41 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client():
+    from cache import exam_handler
+    from routers.calc_router import calc_router
+    from routers.jobs_router import jobs_router
+    from routers.forecast_router import forecast_router
+
+    app = FastAPI()
+    app.include_router(calc_router)
+    app.include_router(jobs_router)
+    app.include_router(forecast_router)
+    # Данные не нужны: запросы с неверными параметрами не доходят до расчета
+    app.dependency_overrides[exam_handler] = lambda: None
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("query", [
+    "percentile=2", "percentile=0", "decay=1", "alpha=-0.1", "passes=-1", "passes=100",
+])
+def test_chart_params_are_bounded(client, query):
+    assert client.get(f"/charts/1?{query}").status_code == 422
+
+
+@pytest.mark.parametrize("body", [
+    {"percentile": 5}, {"decay": 0}, {"alpha": 1.5}, {"passes": 100},
+])
+def test_job_params_are_bounded(client, body):
+    assert client.post("/jobs", json=body).status_code == 422
+
+
+@pytest.mark.parametrize("body", [
+    {"group_id": [2**63], "teacher_id": [1], "subject_id": [1], "exam_index": [1]},
+    {"items": [{"group_id": 1, "teacher_id": -2**63 - 1, "subject_id": 1, "exam_index": 1}]},
+])
+def test_forecast_ids_are_bounded_to_int64(client, body):
+    assert client.post("/forecast/batch", json=body).status_code == 422
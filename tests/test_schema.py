@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from predict import DataHandler, Model, apply_schema
+
+BIG_ID = 3_000_000_000
+
+
+def test_small_ids_stay_int32():
+    frame = apply_schema(pd.DataFrame({"academic_group_id": [1, 2], "teacher_id": [1.0, np.nan]}))
+    assert str(frame["academic_group_id"].dtype) == "Int32"
+    assert str(frame["teacher_id"].dtype) == "Int32"
+
+
+def test_large_ids(exam_csv):
+    path = exam_csv([1, BIG_ID], [BIG_ID + 1, 7], [BIG_ID + 2, 8])
+
+    prepared = DataHandler(path)
+    loaded = DataHandler(path)  # из колоночного хранилища
+    pd.testing.assert_frame_equal(prepared.groups, loaded.groups)
+    assert str(loaded.groups["academic_group_id"].dtype) == "Int64"
+
+    results = Model(loaded, decay=0.9, alpha=0.1).calculate_all()
+    assert set(results["academic_group_id"].tolist()) == {1, BIG_ID}
+    assert loaded.examiner_norms.get(BIG_ID + 1) is not None
+
+    forecast = loaded.forecast_index().forecast(BIG_ID, BIG_ID + 1, BIG_ID + 2, 11)
+    assert 0.0 <= forecast <= 1.0
@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, func, select
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Загруженные файлы лежат в uploads/ текущего каталога
+    monkeypatch.chdir(tmp_path)
+    import database
+    import models
+    from routers import uploads
+
+    database.Base.metadata.create_all(database.engine)
+    with database.SessionLocal() as db:
+        for model in (models.ProcessedUpload, models.Exam, models.Group, models.Teacher,
+                      models.Subject, models.User):
+            db.execute(delete(model))
+        db.add(models.User(id=1))
+        db.commit()
+
+    (tmp_path / "uploads").mkdir(exist_ok=True)
+    write_group_csv(tmp_path)
+    pd.DataFrame({"id": [1], "title": ["П"]}).to_csv(tmp_path / "uploads" / "subject.csv", index=False)
+    pd.DataFrame({"id": [1], "firstname": ["А"], "lastname": ["Б"], "patronymic": ["В"]}).to_csv(
+        tmp_path / "uploads" / "teacher.csv", index=False)
+
+    app = FastAPI()
+    app.include_router(uploads.router_upload)
+    app.dependency_overrides[uploads.get_current_user] = lambda: models.User(id=1)
+    return TestClient(app)
+
+
+def write_group_csv(path):
+    pd.DataFrame({"id": [1, 2], "title": ["Г-1", "Г-2"], "start_year": 2020}).to_csv(
+        path / "uploads" / "group.csv", index=False)
+
+
+def write_exam_csv(path, rows):
+    pd.DataFrame({
+        "academic_group_id": [1, 2] * rows, "teacher_id": 1, "subject_id": 1,
+        "session_number": 1, "exam_number": 1, "success_count": 5, "all_count": 10,
+    }).to_csv(path / "uploads" / "exam.csv", index=False)
+
+
+def exam_count():
+    import database
+    import models
+
+    with database.SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(models.Exam))
+
+
+def test_identical_exam_csv_is_imported_once(client, tmp_path):
+    write_exam_csv(tmp_path, 3)
+    first = client.post("/process-uploads").json()
+    assert first["inserted_exams"] == 6 and not first["exam_unchanged"]
+
+    second = client.post("/process-uploads").json()
+    assert second["inserted_exams"] == 0 and second["exam_unchanged"]
+    assert exam_count() == 6
+
+    # Измененный файл импортируется снова
+    write_exam_csv(tmp_path, 4)
+    third = client.post("/process-uploads").json()
+    assert third["inserted_exams"] == 8 and not third["exam_unchanged"]
+    assert exam_count() == 14
+
+
+def test_exams_with_unknown_references_are_imported_later(client, tmp_path):
+    (tmp_path / "uploads" / "group.csv").unlink()
+    write_exam_csv(tmp_path, 3)
+    first = client.post("/process-uploads").json()
+    assert first["inserted_exams"] == 0 and first["skipped_exams"] == 6
+
+    # После загрузки групп тот же exam.csv импортируется
+    write_group_csv(tmp_path)
+    second = client.post("/process-uploads").json()
+    assert second["inserted_exams"] == 6 and not second["exam_unchanged"]
+    assert exam_count() == 6
+
+    third = client.post("/process-uploads").json()
+    assert third["inserted_exams"] == 0 and third["exam_unchanged"]
@@ -0,0 +1,75 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from columnar import atomic_write
+
+
+class TraceSink():
+    """
+    Приемник отладочных строк модели. Базовый вариант ничего не делает.
+    """
+    enabled = False
+
+    def write(self, stage: str, rows: pd.DataFrame):
+        pass
+
+    def flush(self):
+        pass
+
+
+class MemoryTraceSink(TraceSink):
+    """
+    Накопление отладочных строк в памяти
+    """
+    enabled = True
+
+    def __init__(self):
+        self._frames: list[pd.DataFrame] = []
+        self._lock = threading.Lock()
+
+    def write(self, stage: str, rows: pd.DataFrame):
+        if rows.empty:
+            return
+        rows = rows.assign(group_id=rows["academic_group_id"], stage=stage)
+        with self._lock:
+            self._frames.append(rows)
+
+    def frames(self) -> pd.DataFrame:
+        """
+        Все накопленные строки одним кадром
+        """
+        with self._lock:
+            frames = list(self._frames)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def drain(self) -> pd.DataFrame:
+        with self._lock:
+            frames, self._frames = self._frames, []
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+# Один поток записи на процесс: запросы не пишут в файлы одновременно
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-writer")
+
+
+def _write_file(path: str, rows: pd.DataFrame):
+    with atomic_write(path) as f:
+        rows.to_csv(f, sep="\t", index=False)
+
+
+class FileTraceSink(MemoryTraceSink):
+    """
+    Строки копятся в памяти, а flush() записывает их в файл в фоновом потоке.
+    Каждый flush заменяет файл целиком последним расчетом.
+    """
+    def __init__(self, path: str = "debug_groups.txt"):
+        super().__init__()
+        self.path = path
+
+    def flush(self):
+        rows = self.drain()
+        if rows.empty:
+            return None
+        return _writer.submit(_write_file, self.path, rows)